@@ -3,40 +3,295 @@
 Duolingo BI Dashboard - Flask API with SQLite Cache
 """
 import os
-from flask import Flask, jsonify, request
+import sys
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager
+from operator import itemgetter
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import csv
+import gzip
+import io
 import json
 
+from flask.json.provider import DefaultJSONProvider
+
+# 高速化用の任意依存（なければ標準のjson/gzipのみで動作）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 from database import (
     init_database,
     insert_reports_bulk,
-    get_all_reports,
+    get_reports_page,
+    iter_reports,
+    INSERT_CHUNK_SIZE,
+    get_report_stats,
+    get_report_stats_by_period,
+    get_reports_version,
+    add_reports_change_listener,
+    ROLLUP_PERIODS,
+    DEFAULT_ACCOUNT,
+    account_dir,
+    account_exists,
+    list_accounts,
+    validate_account_id,
     get_latest_date,
-    count_reports
+    get_latest_timestamp,
+    get_sync_cursor,
+    save_sync_cursor,
+    clear_sync_cursor,
+    filter_new_message_ids,
+    save_raw_messages,
+    iter_raw_messages,
+    decode_raw_message,
+    connection
+)
+from duolingo_parser import is_weekly_report, parse_message
+from sync_jobs import SyncJobRunner, SyncProgress
+from sync_scheduler import (
+    SyncScheduler,
+    parse_weekdays,
+    DEFAULT_HOUR_UTC,
+    DEFAULT_JITTER_SECONDS
+)
+from gmail_fetch import (
+    fetch_messages_batch,
+    iter_message_id_pages,
+    get_current_history_id,
+    list_history_message_ids,
+    ConcurrentMessageFetcher,
+    BATCH_CHUNK_SIZE,
+    FETCH_MAX_WORKERS
 )
 
+from google.auth.exceptions import RefreshError, TransportError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-import base64
-import re
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 
 app = Flask(__name__)
 CORS(app)
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+WEEKLY_REPORT_QUERY = 'from:duolingo "今週の進捗はいかに"'
+# 差分同期時の検索範囲はウォーターマーク（保存済み最新レポート日時）から1日さかのぼる
+WATERMARK_SLACK_SECONDS = 24 * 60 * 60
+# 取得・解析・保存を行う1チャンクの件数
+SYNC_CHUNK_SIZE = BATCH_CHUNK_SIZE
+# 2段階取得のmessages.get引数（ヘッダーは件名・日付のみ、本文はMIMEパートのデータのみ）
+METADATA_GET_KWARGS = {
+    'format': 'metadata',
+    'metadataHeaders': ['Subject', 'Date'],
+    'fields': 'id,snippet,payload/headers'
+}
+BODY_GET_KWARGS = {
+    'format': 'full',
+    'fields': 'id,payload(mimeType,body/data,parts(mimeType,body/data,parts(mimeType,body/data,parts)))'
+}
+# メッセージ取得方式（batch: バッチHTTP / concurrent: スレッドプール）
+FETCH_ENGINE = os.environ.get('GMAIL_FETCH_ENGINE', 'batch')
+FETCH_CONCURRENCY = int(os.environ.get('GMAIL_FETCH_CONCURRENCY', FETCH_MAX_WORKERS))
+# 解析用プロセス数（0ならリクエストスレッド内で解析）と1回に渡す件数
+PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', '0'))
+PARSE_CHUNK_SIZE = 8
+# 同時に実行する同期ジョブ数（アカウントごとに別DBのため並行して書き込める）
+SYNC_MAX_CONCURRENCY = int(os.environ.get('SYNC_MAX_CONCURRENCY', '2'))
+# 定期同期（曜日は月曜=0のカンマ区切り、時刻はUTC、アカウントごとに最大ジッター秒ずらす）
+SYNC_SCHEDULE_ENABLED = os.environ.get('SYNC_SCHEDULE_ENABLED', '1') == '1'
+SYNC_SCHEDULE_WEEKDAYS = parse_weekdays(os.environ.get('SYNC_SCHEDULE_WEEKDAYS', '5,6,0'))
+SYNC_SCHEDULE_HOUR_UTC = int(os.environ.get('SYNC_SCHEDULE_HOUR_UTC', DEFAULT_HOUR_UTC))
+SYNC_SCHEDULE_JITTER_SECONDS = float(os.environ.get('SYNC_SCHEDULE_JITTER_SECONDS', DEFAULT_JITTER_SECONDS))
+# アクセストークンの残り時間がこれを切ったら先行リフレッシュ
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+
+# レポート一覧の1ページ件数（limit未指定時）と上限
+REPORTS_DEFAULT_LIMIT = 100
+REPORTS_MAX_LIMIT = 500
+# レポート一覧で返す列（カーソル用のtimestamp・rowidやmessage_idは含めない）
+REPORT_FIELDS = ('date', 'subject', 'xp', 'minutes', 'lessons', 'streak')
+# サマリの週次比較に使う指標
+SUMMARY_METRICS = ('xp', 'minutes', 'lessons', 'streak')
+# レスポンス本文キャッシュの最大件数（クエリパラメータの組み合わせ数）
+RESPONSE_CACHE_SIZE = 128
+# この大きさ未満のレスポンスは圧縮しない（バイト）
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+# エクスポート・インポートの列（インポートは全列必須）
+EXPORT_FIELDS = ('message_id', 'subject', 'date', 'xp', 'minutes', 'lessons', 'streak')
+EXPORT_TEXT_FIELDS = ('message_id', 'subject', 'date')
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# SQLiteのINTEGERの範囲（カーソルの値はこの範囲外だとバインドできない）
+SQLITE_INTEGER_MIN = -2 ** 63
+SQLITE_INTEGER_MAX = 2 ** 63 - 1
+# timestampのみのカーソルで使うrowidの下限・上限
+CURSOR_MIN_ROWID = 0
+CURSOR_MAX_ROWID = SQLITE_INTEGER_MAX
+
+# Gmailクライアントのプロセス内キャッシュ（_gmail_lockはキャッシュ辞書の操作のみに使う）
+_gmail_lock = threading.Lock()
+# アカウントIDごとの認証情報と、その取得・リフレッシュを直列化するロック
+_gmail_credentials = {}
+_gmail_account_locks = {}
+_gmail_discovery_lock = threading.Lock()
+_gmail_discovery_document = None
+_gmail_local = threading.local()
+
+# 解析用プロセスプール（プロセス数ごとに1つ、初回の並列解析時に生成）
+_parse_pools = {}
+_parse_pools_lock = threading.Lock()
+
+
+class GmailAuthRequiredError(Exception):
+    """アカウントの認証情報がなく、ブラウザでの認証が必要"""
+
+
+class ResponseCache:
+    """シリアライズ済みレスポンス本文のLRUキャッシュ（reports変更時に全破棄）"""
+    
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # 破棄のたびに進め、破棄前に読んだ古い本文を格納しないようにする
+        self.generation = 0
+    
+    def get(self, key):
+        """本文と版数を取得（なければNone）"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+    
+    def put(self, key, body, version_info, generation, encoded=None):
+        """generation以降に破棄されていなければ格納し、超過分は古い順に追い出す"""
+        with self.lock:
+            if generation != self.generation:
+                return
+            # 圧縮済み本文は方式ごとに初回の配信時にencodedへ追加する
+            self.entries[key] = (body, version_info, {} if encoded is None else encoded)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """全件破棄"""
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+
+response_cache = ResponseCache()
+add_reports_change_listener(response_cache.clear)
+
+
+# 日付型はorjson独自のISO形式にせず、標準のjsonと同じFlask既定の変換（HTTP日付）に回す
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson is not None else 0
+
 
-def ensure_gmail_auth():
-    """Gmail認証を確実に行う（自動再認証機能付き）"""
+class FastJSONProvider(DefaultJSONProvider):
+    """orjsonがあれば使うJSONプロバイダ（なければ標準のjsonで空白なしに書き出す）"""
+    
+    def dumps(self, obj, **kwargs):
+        # sort_keys・indentなどの引数指定時は標準のjsonにそのまま渡す
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode('utf-8')
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', False)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            body = orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+        else:
+            body = self.dumps(obj).encode('utf-8')
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+app.json = FastJSONProvider(app)
+
+
+def negotiate_encoding():
+    """Accept-Encodingから圧縮方式を選択（brotliはライブラリがある場合のみ）"""
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(candidates)
+
+
+def compress_body(body, encoding):
+    """本文を指定方式で圧縮"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def set_encoded_body(response, body, encoding):
+    """圧縮済み本文とContent-Encodingを設定"""
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """閾値以上のJSON/テキスト応答をクライアントが受け付ける方式で圧縮"""
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+    return set_encoded_body(response, compress_body(body, encoding), encoding)
+
+
+def is_revoked_grant(error):
+    """リフレッシュトークンが失効・取り消し済みか判定（通信エラーなど一時的な失敗はFalse）"""
+    if not isinstance(error, RefreshError) or error.retryable:
+        return False
+    details = error.args[1] if len(error.args) > 1 and isinstance(error.args[1], dict) else {}
+    return details.get('error') == 'invalid_grant' or 'invalid_grant' in str(error.args[0] if error.args else '')
+
+
+def ensure_gmail_auth(token_path='token.json', interactive=True):
+    """Gmail認証を確実に行う（自動再認証機能付き、認証情報はtoken_pathに保存、interactive=Falseならブラウザ認証はしない）"""
     try:
         creds = None
         
-        if os.path.exists('token.json'):
+        if os.path.exists(token_path):
             try:
-                creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+                creds = Credentials.from_authorized_user_file(token_path, SCOPES)
                 
                 if creds and creds.valid:
                     print("✅ 既存の認証情報を使用")
@@ -46,15 +301,27 @@ def ensure_gmail_auth():
                     print("🔄 認証情報をリフレッシュ中...")
                     creds.refresh(Request())
                     
-                    with open('token.json', 'w') as token:
+                    with open(token_path, 'w') as token:
                         token.write(creds.to_json())
                     print("✅ 認証情報をリフレッシュしました")
                     return creds
-                    
-            except Exception as refresh_error:
+            
+            except ValueError as load_error:
+                # 壊れたファイルは残し、対話モードの新規認証で上書きする
+                print(f"⚠️ {token_path}を読み込めません: {load_error}")
+                creds = None
+            
+            except RefreshError as refresh_error:
+                # 一時的な失敗でtoken.jsonを消すと再認証まで定期同期の対象から外れるため、失効時のみ削除
+                if not is_revoked_grant(refresh_error):
+                    raise
                 print(f"🗑️ 認証情報が無効です: {refresh_error}")
-                os.remove('token.json')
-                print("🗑️ 無効なtoken.jsonを削除しました")
+                os.remove(token_path)
+                print(f"🗑️ 無効な{token_path}を削除しました")
+        
+        if not interactive:
+            print(f"🔒 {token_path}に有効な認証情報がありません（非対話モードのため新規認証は行いません）")
+            return None
         
         if not os.path.exists('credentials.json'):
             raise Exception("credentials.jsonが見つかりません。Google Cloud Consoleから認証情報をダウンロードしてください。")
@@ -66,205 +333,642 @@ def ensure_gmail_auth():
             'credentials.json', SCOPES)
         creds = flow.run_local_server(port=0)
         
-        with open('token.json', 'w') as token:
+        with open(token_path, 'w') as token:
             token.write(creds.to_json())
         
         print("✅ 新規認証が完了しました")
         return creds
-        
+    
+    except (RefreshError, TransportError):
+        # 一時的なエラーはtoken.jsonを残したまま呼び出し元で失敗させ、次回の同期で再試行する
+        raise
+    
     except Exception as e:
         print(f"❌ Gmail認証エラー: {e}")
         return None
 
 
-def get_gmail_service():
-    """Gmail APIサービス取得（認証自動化）"""
-    creds = ensure_gmail_auth()
-    if not creds:
-        raise Exception("Gmail認証に失敗しました")
-    
-    return build('gmail', 'v1', credentials=creds)
+def credentials_expiring(creds, margin=CREDENTIALS_REFRESH_MARGIN):
+    """認証情報の期限切れ間近判定（期限不明ならFalse）"""
+    if creds.expiry is None:
+        return False
+    return creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None) <= margin
+
+
+def account_token_path(account_id=DEFAULT_ACCOUNT):
+    """アカウントの認証情報ファイルパス（既定アカウントは従来のtoken.json）"""
+    if account_id == DEFAULT_ACCOUNT:
+        return 'token.json'
+    return os.path.join(account_dir(account_id), 'token.json')
 
 
-def get_duolingo_weekly_reports():
-    """Duolingoウィークリーレポート取得（修正版）"""
+def refresh_gmail_credentials(creds, token_path):
+    """期限切れ間近の認証情報をリフレッシュしてtoken_pathを更新（使えなくなった場合はNone）"""
+    if not creds.refresh_token:
+        # リフレッシュできないため期限内なら使い、切れていれば破棄
+        return None if creds.expired else creds
+    
+    print("🔄 認証情報を先行リフレッシュ中...")
     try:
-        service = get_gmail_service()
+        creds.refresh(Request())
+    except RefreshError as e:
+        if not is_revoked_grant(e):
+            raise
+        print(f"🗑️ 認証情報のリフレッシュに失敗しました: {e}")
+        return None
+    
+    with open(token_path, 'w') as token:
+        token.write(creds.to_json())
+    return creds
+
+
+def gmail_account_lock(account_id):
+    """アカウントの認証情報用ロック取得（リフレッシュ中も他アカウントは待たせない）"""
+    with _gmail_lock:
+        lock = _gmail_account_locks.get(account_id)
+        if lock is None:
+            lock = _gmail_account_locks[account_id] = threading.Lock()
+        return lock
+
+
+def get_gmail_credentials(account_id=DEFAULT_ACCOUNT):
+    """アカウントの認証情報取得（プロセス内キャッシュ、期限前に先行リフレッシュ、ブラウザ認証はしない）"""
+    token_path = account_token_path(account_id)
+    
+    with gmail_account_lock(account_id):
+        creds = _gmail_credentials.get(account_id)
         
-        queries = [
-            'from:duolingo "今週の進捗はいかに"'
-        ]
+        if creds is not None and credentials_expiring(creds):
+            creds = refresh_gmail_credentials(creds, token_path)
+            if creds is None:
+                # 失効した認証情報はキャッシュから外し、token.jsonからの再認証に任せる
+                _gmail_credentials.pop(account_id, None)
         
-        all_reports = []
+        if creds is None:
+            # 同期はバックグラウンドで動くため、ブラウザ認証は python app.py auth で事前に行う
+            creds = ensure_gmail_auth(token_path, interactive=False)
+            if not creds:
+                raise GmailAuthRequiredError(
+                    f"アカウント{account_id}は未認証です。python app.py auth {account_id} で認証してください"
+                )
+            _gmail_credentials[account_id] = creds
         
-        for query in queries:
-            print(f"🔍 検索クエリ: {query}")
+        return creds
+
+
+def get_gmail_discovery_document():
+    """Gmail APIディスカバリードキュメント取得（同梱の静的コピーを1回だけ読み込む）"""
+    global _gmail_discovery_document
+    
+    with _gmail_discovery_lock:
+        if _gmail_discovery_document is None:
+            _gmail_discovery_document = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        return _gmail_discovery_document
+
+
+def get_gmail_service(account_id=DEFAULT_ACCOUNT):
+    """アカウントのGmail APIサービス取得（スレッドごとにキャッシュ、認証情報は共有）"""
+    creds = get_gmail_credentials(account_id)
+    
+    # googleapiclientのhttpはスレッドセーフではないためサービスはスレッド・アカウント単位で保持
+    services = getattr(_gmail_local, 'services', None)
+    if services is None:
+        services = _gmail_local.services = {}
+    
+    service, service_creds = services.get(account_id, (None, None))
+    if service is None or service_creds is not creds:
+        service = build_from_document(get_gmail_discovery_document(), credentials=creds)
+        services[account_id] = (service, creds)
+    
+    return service
+
+
+def reset_gmail_service_cache():
+    """認証情報・サービスのキャッシュ破棄"""
+    global _gmail_credentials, _gmail_account_locks, _gmail_local
+    
+    with _gmail_lock:
+        _gmail_credentials = {}
+        _gmail_account_locks = {}
+        _gmail_local = threading.local()
+
+
+def list_report_message_id_pages(service, cursor=None):
+    """同期対象メッセージIDのページ列取得（カーソルがあればhistoryIdで差分のみ）"""
+    started_at = int(time.time())
+    
+    if cursor:
+        history = list_history_message_ids(service, cursor['history_id'])
+        
+        if history is None:
+            print("⚠️ 同期カーソルが失効したためフル同期を実行...")
+        else:
+            added_ids, history_id = history
+            next_cursor = {'history_id': history_id, 'watermark': started_at}
+            print(f"📬 historyId {cursor['history_id']} 以降の追加メール数: {len(added_ids)}")
             
-            results = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=20
-            ).execute()
+            if not added_ids:
+                return iter(()), next_cursor
             
-            messages = results.get('messages', [])
-            print(f"📨 発見メール数: {len(messages)}")
+            after = max(cursor['watermark'] - WATERMARK_SLACK_SECONDS, 0)
+            query = f"{WEEKLY_REPORT_QUERY} after:{after}"
+            print(f"🔍 検索クエリ: {query}")
             
-            for message in messages:
-                msg = service.users().messages().get(
-                    userId='me',
-                    id=message['id']
-                ).execute()
-                
-                headers = msg['payload'].get('headers', [])
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-                date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-                
-                body = extract_email_body(msg)
-                
-                if is_weekly_report(subject, body):
-                    print(f"✅ 確定: ウィークリーレポート - {subject}")
-                    
-                    data = extract_duolingo_data(body)
-                    if data:
-                        all_reports.append({
-                            'subject': subject,
-                            'date': date,
-                            'message_id': message['id'],
-                            'data': data
-                        })
-                    else:
-                        print(f"⚠️ データ抽出失敗: {subject}")
-        
-        return all_reports
+            return filter_added_pages(iter_message_id_pages(service, query), added_ids), next_cursor
+    
+    history_id = get_current_history_id(service)
+    print(f"🔍 検索クエリ: {WEEKLY_REPORT_QUERY}")
+    
+    pages = iter_message_id_pages(service, WEEKLY_REPORT_QUERY)
+    return pages, {'history_id': history_id, 'watermark': started_at}
+
+
+def filter_added_pages(pages, added_ids):
+    """historyで追加されたIDのみ通す（全件見つかった時点でページングを打ち切る）"""
+    remaining = set(added_ids)
+    
+    for page in pages:
+        matched = [mid for mid in page if mid in remaining]
+        remaining.difference_update(matched)
+        if matched:
+            yield matched
+        if not remaining:
+            break
+
+
+def iter_new_message_id_chunks(pages, chunk_size=SYNC_CHUNK_SIZE, conn=None, require_raw=False):
+    """ページ列をchunk_size件ずつに詰め直し、保存済みIDを除外して返す（require_raw=Trueなら生メッセージ未保存のIDは残す）"""
+    buffer = []
+    
+    def flush():
+        new_message_ids = filter_new_message_ids(buffer, conn, require_raw)
+        skipped = len(buffer) - len(new_message_ids)
+        if skipped:
+            print(f"⏭️ 保存済みのためスキップ: {skipped}件")
+        return new_message_ids
+    
+    for page in pages:
+        for message_id in page:
+            buffer.append(message_id)
+            if len(buffer) >= chunk_size:
+                new_message_ids = flush()
+                buffer = []
+                if new_message_ids:
+                    yield new_message_ids
+    
+    if buffer:
+        new_message_ids = flush()
+        if new_message_ids:
+            yield new_message_ids
+
+
+def get_header(msg, name):
+    """メッセージヘッダー値取得"""
+    headers = msg.get('payload', {}).get('headers', [])
+    return next((h['value'] for h in headers if h['name'] == name), '')
+
+
+def select_report_candidates(message_ids, metadata):
+    """メタデータ（件名・スニペット）でウィークリーレポート候補を選別"""
+    candidate_ids = []
+    
+    for message_id in message_ids:
+        msg = metadata.get(message_id)
+        if msg is None:
+            continue
         
-    except Exception as e:
-        print(f"❌ メール取得エラー: {e}")
-        return []
+        subject = get_header(msg, 'Subject')
+        if is_weekly_report(subject, msg.get('snippet', '')):
+            candidate_ids.append(message_id)
+        else:
+            print(f"❌ 除外: {subject}")
+    
+    return candidate_ids
 
 
-def is_weekly_report(subject, body):
-    """ウィークリーレポート確定判定"""
-    weekly_subjects = [
-        "週間レポート", "ウィークリーレポート", "Weekly Progress",
-        "進捗をチェック", "成果が積み重なって"
-    ]
+def parse_weekly_reports(message_ids, metadata, bodies, parse_pool=None):
+    """メタデータと本文からウィークリーレポートを抽出（parse_poolがあれば並列解析）"""
+    reports = []
     
-    if any(ws in subject for ws in weekly_subjects):
-        return True
+    message_ids = [message_id for message_id in message_ids if message_id in bodies]
+    payloads = [bodies[message_id] for message_id in message_ids]
     
-    weekly_patterns = [
-        r'\d+XP',
-        r'\d+分',
-        r'レッスン\s*\d+回',
-        r'\d+日連続',
-        r'Weekly Progress'
-    ]
+    # executor.mapは入力順で結果を返すため、並列でも結果の順序は変わらない
+    if parse_pool is None:
+        results = map(parse_message, payloads)
+    else:
+        results = parse_pool.map(parse_message, payloads, chunksize=PARSE_CHUNK_SIZE)
     
-    matches = sum(1 for pattern in weekly_patterns if re.search(pattern, body))
-    return matches >= 3
+    for message_id, data in zip(message_ids, results):
+        subject = get_header(metadata[message_id], 'Subject')
+        date = get_header(metadata[message_id], 'Date')
+        
+        print(f"✅ 確定: ウィークリーレポート - {subject}")
+        
+        if data:
+            reports.append({
+                'subject': subject,
+                'date': date,
+                'message_id': message_id,
+                'data': data
+            })
+        else:
+            print(f"⚠️ データ抽出失敗: {subject}")
+    
+    return reports
+
+
+def build_raw_messages(message_ids, metadata, bodies):
+    """再解析用に保存する生メッセージ（件名・日付と本文レスポンス）を生成"""
+    return [
+        {
+            'message_id': message_id,
+            'subject': get_header(metadata[message_id], 'Subject'),
+            'date': get_header(metadata[message_id], 'Date'),
+            'message': bodies[message_id]
+        }
+        for message_id in message_ids if message_id in bodies
+    ]
+
 
+def build_db_reports(gmail_reports):
+    """Gmail取得結果をDB保存形式に変換"""
+    db_reports = []
+    for report in gmail_reports:
+        if report.get('data'):
+            db_reports.append({
+                'message_id': report['message_id'],
+                'subject': report['subject'],
+                'date': report['date'],
+                'xp': report['data'].get('xp', 0),
+                'minutes': report['data'].get('minutes', 0),
+                'lessons': report['data'].get('lessons', 0),
+                'streak': report['data'].get('streak', 0)
+            })
+    return db_reports
 
-def extract_duolingo_data(body):
-    """Duolingo学習データ抽出"""
-    data = {}
+
+def run_sync_pipeline(
+    service, pages, chunk_size=SYNC_CHUNK_SIZE, fetch=None, parse_pool=None, conn=None, progress=None,
+    require_raw=False, failed_ids=None
+):
+    """一覧 → 取得 → 解析 → 保存をチャンク単位で流し、新規件数を返す（各段の件数はprogressへ、取得失敗IDはfailed_idsへ追加）"""
+    if fetch is None:
+        fetch = lambda message_ids, **get_kwargs: fetch_messages_batch(
+            service, message_ids, chunk_size=chunk_size, **get_kwargs
+        )
+    if progress is None:
+        progress = SyncProgress()
+    if failed_ids is None:
+        failed_ids = []
     
-    xp_match = re.search(r'(\d+)XP', body)
-    if xp_match:
-        data['xp'] = int(xp_match.group(1))
+    def counted_pages():
+        for page in pages:
+            progress.add(listed=len(page))
+            yield page
     
-    minutes_match = re.search(r'(\d+)分', body)
-    if minutes_match:
-        data['minutes'] = int(minutes_match.group(1))
+    # 各段はジェネレータで1チャンクずつ引き出すため、メモリ上には常に
+    # 1ページ分のIDと1チャンク分のメッセージしか載らない。
+    # チャンクごとにコミットするので途中で失敗しても保存済み分は残る。
+    new_count = 0
     
-    lessons_match = re.search(r'レッスン\s*(\d+)回', body)
-    if lessons_match:
-        data['lessons'] = int(lessons_match.group(1))
+    for chunk in iter_new_message_id_chunks(counted_pages(), chunk_size, conn, require_raw):
+        # 1段目: 件名・日付ヘッダーとスニペットのみ取得して候補を絞る
+        metadata = fetch(chunk, **METADATA_GET_KWARGS)
+        progress.add(fetched=len(metadata), errors=len(chunk) - len(metadata))
+        failed_ids.extend(message_id for message_id in chunk if message_id not in metadata)
+        candidate_ids = select_report_candidates(chunk, metadata)
+        if not candidate_ids:
+            continue
+        
+        # 2段目: 候補のみ本文パートだけを取得（取得・抽出に失敗した候補はエラーとして数える）
+        bodies = fetch(candidate_ids, **BODY_GET_KWARGS)
+        failed_ids.extend(message_id for message_id in candidate_ids if message_id not in bodies)
+        # 抽出ルール変更時にGmailから取り直さず再解析できるよう、解析前に圧縮して保存
+        save_raw_messages(build_raw_messages(candidate_ids, metadata, bodies), conn)
+        reports = parse_weekly_reports(candidate_ids, metadata, bodies, parse_pool)
+        progress.add(parsed=len(reports), errors=len(candidate_ids) - len(reports))
+        
+        if reports:
+            inserted = insert_reports_bulk(build_db_reports(reports), conn)
+            new_count += inserted
+            progress.add(inserted=inserted)
+            print(f"💾 チャンク保存: {inserted}/{len(chunk)}件")
     
-    streak_match = re.search(r'(\d+)日連続', body)
-    if streak_match:
-        data['streak'] = int(streak_match.group(1))
+    return new_count
+
+
+def create_parse_pool(workers):
+    """解析用プロセスプール生成（spawnでFlaskのスレッド状態を引き継がない）"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+@contextmanager
+def shared_parse_pool(workers):
+    """プロセス数ごとに1つの解析用プロセスプールを使い回す（ワーカーが落ちて壊れたプールは破棄し、次回作り直す）"""
+    # spawnのワーカーは起動時に起動スクリプト（app.py）を__mp_main__として読み込むため、同期ごとに作り直さない
+    with _parse_pools_lock:
+        pool = _parse_pools.get(workers)
+        if pool is None:
+            pool = _parse_pools[workers] = create_parse_pool(workers)
     
-    return data if data else None
+    try:
+        yield pool
+    except BrokenProcessPool:
+        with _parse_pools_lock:
+            if _parse_pools.get(workers) is pool:
+                del _parse_pools[workers]
+        pool.shutdown(wait=False)
+        raise
+
+
+def sync_gmail_reports(full=False, parse_workers=PARSE_WORKERS, progress=None, account_id=DEFAULT_ACCOUNT):
+    """アカウントのGmail同期（差分優先、full=Trueでフル同期）して新規件数を返す"""
+    with ExitStack() as stack:
+        conn = stack.enter_context(connection(account_id=account_id))
+        cursor = None if full else get_sync_cursor(conn)
+        
+        service = get_gmail_service(account_id)
+        pages, next_cursor = list_report_message_id_pages(service, cursor)
+        
+        parse_pool = None
+        if parse_workers > 0:
+            parse_pool = stack.enter_context(shared_parse_pool(parse_workers))
+            print(f"🧮 並列解析: {parse_workers}プロセス")
+        
+        failed_ids = []
+        if FETCH_ENGINE == 'concurrent':
+            fetcher = stack.enter_context(
+                ConcurrentMessageFetcher(lambda: get_gmail_service(account_id), max_workers=FETCH_CONCURRENCY)
+            )
+            new_count = run_sync_pipeline(
+                service, pages, fetch=fetcher.fetch, parse_pool=parse_pool, conn=conn, progress=progress,
+                require_raw=full, failed_ids=failed_ids
+            )
+            stats = fetcher.stats()
+            print(
+                f"⏱️ 取得レイテンシ: p50 {stats['p50_ms']}ms / p95 {stats['p95_ms']}ms / max {stats['max_ms']}ms"
+                f"（{stats['count']}リクエスト, 並列{stats['workers']}, 再試行{stats['retries']}, 失敗{stats['failures']}）"
+            )
+        else:
+            new_count = run_sync_pipeline(
+                service, pages, parse_pool=parse_pool, conn=conn, progress=progress, require_raw=full,
+                failed_ids=failed_ids
+            )
+        
+        if failed_ids:
+            # カーソルを進めると取得できなかったメッセージが次回の差分に含まれなくなるため、
+            # 差分同期は前回のカーソルのまま、フル同期はカーソルを消して次回もフル同期にする
+            print(f"⚠️ 取得できなかったメッセージ{len(failed_ids)}件を次回再取得するため同期カーソルを進めません")
+            if full:
+                clear_sync_cursor(conn)
+        else:
+            # 次回の差分検索は保存済みの最新レポート日時を基準にする
+            watermark = get_latest_timestamp(conn) or next_cursor['watermark']
+            save_sync_cursor(next_cursor['history_id'], watermark, conn)
+    
+    return new_count
 
 
-def extract_email_body(msg):
-    """メール本文抽出（改良版）"""
-    body = ""
+def reparse_raw_messages(conn=None, parse_pool=None):
+    """保存済みの生メッセージを再解析してレポートを更新（Gmailにはアクセスしない）し、件数を返す"""
+    counts = {'messages': 0, 'parsed': 0, 'inserted': 0, 'errors': 0}
     
-    def extract_text_from_payload(payload):
-        nonlocal body
+    for rows in iter_raw_messages(conn=conn):
+        bodies = [decode_raw_message(row['payload']) for row in rows]
+        if parse_pool is None:
+            results = map(parse_message, bodies)
+        else:
+            results = parse_pool.map(parse_message, bodies, chunksize=PARSE_CHUNK_SIZE)
+        
+        reports = [
+            {
+                'message_id': row['message_id'],
+                'subject': row['subject'],
+                'date': row['date'],
+                'data': data
+            }
+            for row, data in zip(rows, results) if data
+        ]
+        
+        # 既存レポートは新しい抽出結果で指標を上書きする
+        inserted = insert_reports_bulk(build_db_reports(reports), conn, upsert=True)
+        counts['messages'] += len(rows)
+        counts['parsed'] += len(reports)
+        counts['inserted'] += inserted
+        counts['errors'] += len(rows) - len(reports)
+    
+    return counts
+
+
+def reparse_account(account_id, parse_workers=PARSE_WORKERS):
+    """アカウントの保存済み生メッセージを再解析（parse_workers>0ならプロセスプールで並列）"""
+    with ExitStack() as stack:
+        conn = stack.enter_context(connection(account_id=account_id))
+        
+        parse_pool = None
+        if parse_workers > 0:
+            parse_pool = stack.enter_context(shared_parse_pool(parse_workers))
         
-        if 'parts' in payload:
-            for part in payload['parts']:
-                extract_text_from_payload(part)
+        return reparse_raw_messages(conn, parse_pool)
+
+
+# 同期はリクエストスレッドの外で、アカウントごとに1本ずつ実行する
+sync_runner = SyncJobRunner(sync_gmail_reports, max_workers=SYNC_MAX_CONCURRENCY)
+
+
+def submit_sync(account_id, full=False):
+    """アカウントの同期ジョブ投入（同じアカウントの実行中ジョブには合流）"""
+    return sync_runner.submit(key=account_id, account_id=account_id, full=full)
+
+
+def scheduled_accounts():
+    """定期同期の対象アカウント（認証情報が保存済みのもの、未認証はブラウザ認証が必要なため除外）"""
+    return [
+        account_id for account_id in list_accounts()
+        if os.path.exists(account_token_path(account_id))
+    ]
+
+
+def submit_scheduled_sync(account_id):
+    """定期同期の差分同期ジョブ投入（同時実行数はsync_runnerのワーカー数で制限）"""
+    job, created = submit_sync(account_id)
+    if created:
+        print(f"⏰ 定期同期ジョブを開始 {account_id}: {job.id}")
+    return job
+
+
+sync_scheduler = SyncScheduler(
+    submit_scheduled_sync,
+    scheduled_accounts,
+    weekdays=SYNC_SCHEDULE_WEEKDAYS,
+    hour=SYNC_SCHEDULE_HOUR_UTC,
+    jitter=SYNC_SCHEDULE_JITTER_SECONDS
+)
+
+
+def prepare_account(account_id):
+    """アカウントIDを検証しDBを用意（既定アカウント以外は作成済みであること）"""
+    validate_account_id(account_id)
+    if account_exists(account_id):
+        return
+    if account_id != DEFAULT_ACCOUNT:
+        raise LookupError(f"アカウントが見つかりません: {account_id}")
+    init_database(account_id)
+
+
+def account_error_response(account_id):
+    """アカウントが不正なら400、未登録なら404のレスポンス（問題なければNone）"""
+    try:
+        prepare_account(account_id)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except LookupError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    return None
+
+
+def row_getter(row, fields):
+    """行から指定列を順に取り出す関数（sqlite3.Rowの列名検索は遅いため、位置は最初の行で一度だけ求める）"""
+    keys = row.keys()
+    return itemgetter(*(keys.index(field) for field in fields))
+
+
+def format_reports(rows):
+    """レポート行をAPIで返す列だけの辞書に変換"""
+    if not rows:
+        return []
+    values = row_getter(rows[0], REPORT_FIELDS)
+    return [dict(zip(REPORT_FIELDS, values(row))) for row in rows]
+
+
+def encode_report_cursor(report):
+    """ページングカーソル生成（timestamp:rowid）"""
+    return f"{report['timestamp']}:{report['_row_id']}"
+
+
+def parse_report_cursor(value, upper):
+    """ページングカーソル解析（timestampのみの場合はupperに応じてrowidを補完）"""
+    try:
+        if ':' in value:
+            timestamp, row_id = value.split(':', 1)
+            cursor = int(timestamp), int(row_id)
         else:
-            if payload.get('mimeType') == 'text/plain':
-                data = payload.get('body', {}).get('data')
-                if data:
-                    body += base64.urlsafe_b64decode(data).decode('utf-8')
-            elif payload.get('mimeType') == 'text/html':
-                data = payload.get('body', {}).get('data')
-                if data:
-                    html_content = base64.urlsafe_b64decode(data).decode('utf-8')
-                    text = re.sub(r'<[^>]+>', ' ', html_content)
-                    text = re.sub(r'\s+', ' ', text)
-                    body += text
-    
-    extract_text_from_payload(msg['payload'])
-    return body.strip()
-
-
-@app.route('/api/duolingo/reports', methods=['GET'])
-def get_reports():
-    """Duolingoウィークリーレポート一覧取得（DB優先、空なら初回同期）"""
+            cursor = int(value), CURSOR_MAX_ROWID if upper else CURSOR_MIN_ROWID
+    except ValueError:
+        raise ValueError(f"カーソルの形式が不正です: {value}")
+    
+    if not all(SQLITE_INTEGER_MIN <= part <= SQLITE_INTEGER_MAX for part in cursor):
+        raise ValueError(f"カーソルの値が範囲外です: {value}")
+    return cursor
+
+
+def parse_date_param(value, end_of_day=False):
+    """YYYY-MM-DDをUTCのUnix秒へ変換（end_of_dayなら翌日0時）"""
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise ValueError(f"日付はYYYY-MM-DD形式で指定してください: {value}")
+    if end_of_day:
+        day += timedelta(days=1)
+    return int(day.timestamp())
+
+
+def parse_report_page_params(args):
+    """レポート一覧のクエリパラメータ（limit, before, after, since, until）解析"""
+    try:
+        limit = int(args.get('limit', REPORTS_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError(f"limitは整数で指定してください: {args.get('limit')}")
+    if not 1 <= limit <= REPORTS_MAX_LIMIT:
+        raise ValueError(f"limitは1〜{REPORTS_MAX_LIMIT}で指定してください: {limit}")
+    
+    params = {'limit': limit}
+    if args.get('before'):
+        params['before'] = parse_report_cursor(args['before'], upper=False)
+    if args.get('after'):
+        params['after'] = parse_report_cursor(args['after'], upper=True)
+    if args.get('since'):
+        params['since'] = parse_date_param(args['since'])
+    if args.get('until'):
+        params['until'] = parse_date_param(args['until'], end_of_day=True)
+    return params
+
+
+@app.route('/api/duolingo/reports', methods=['GET'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/reports', methods=['GET'])
+def get_reports(account_id):
+    """Duolingoウィークリーレポート一覧取得（DB優先、空なら初回同期、キーセットでページング）"""
+    key = response_cache_key()
+    response = cached_response(key)
+    if response is not None:
+        return response
+    
+    error = account_error_response(account_id)
+    if error is not None:
+        return error
+    
+    generation = response_cache.generation
+    try:
+        page_params = parse_report_page_params(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
     try:
         print("📊 Duolingoレポート取得開始...")
         
-        reports = get_all_reports()
-        
-        if len(reports) == 0:
-            print("🔄 DB空のため初回Gmail同期を実行...")
-            gmail_reports = get_duolingo_weekly_reports()
+        limit = page_params['limit']
+        sync_job = None
+        with connection(account_id=account_id) as conn:
+            initial_sync = get_latest_timestamp(conn) is None
+            if initial_sync:
+                # 初回同期は待たずにバックグラウンドで開始し、空の一覧を返す
+                sync_job, _ = submit_sync(account_id)
+                print(f"🔄 DB空のため初回Gmail同期ジョブを開始: {sync_job.id}")
             
-            if gmail_reports:
-                db_reports = []
-                for report in gmail_reports:
-                    if report.get('data'):
-                        db_reports.append({
-                            'message_id': report['message_id'],
-                            'subject': report['subject'],
-                            'date': report['date'],
-                            'xp': report['data'].get('xp', 0),
-                            'minutes': report['data'].get('minutes', 0),
-                            'lessons': report['data'].get('lessons', 0),
-                            'streak': report['data'].get('streak', 0)
-                        })
-                
-                new_count = insert_reports_bulk(db_reports)
-                print(f"✅ {new_count}件の新規レポートを保存しました")
-                
-                reports = get_all_reports()
+            # 版数が変わっていなければ行を読まずに304
+            version_info = get_reports_version(conn)
+            if is_not_modified(version_info):
+                return not_modified_response(version_info)
+            
+            # 1件多く取得して次ページの有無を判定
+            reports = get_reports_page(**dict(page_params, limit=limit + 1), conn=conn)
         
-        formatted_reports = []
-        for report in reports:
-            formatted_reports.append({
-                'date': report['date'],
-                'subject': report['subject'],
-                'xp': report['xp'],
-                'minutes': report['minutes'],
-                'lessons': report['lessons'],
-                'streak': report['streak']
-            })
+        has_more = len(reports) > limit
+        if has_more:
+            if 'after' in page_params and 'before' not in page_params:
+                reports = reports[1:]
+            else:
+                reports = reports[:limit]
         
-        print(f"✅ {len(formatted_reports)}件のレポートを取得しました")
+        print(f"✅ {len(reports)}件のレポートを取得しました")
         
-        return jsonify({
+        payload = {
             'success': True,
-            'data': formatted_reports,
-            'count': len(formatted_reports),
-            'from_cache': len(reports) > 0
-        })
+            'data': format_reports(reports),
+            'count': len(reports),
+            'from_cache': True,
+            'syncing': sync_job is not None and sync_job.active,
+            'sync_job': sync_job.to_dict() if sync_job else None,
+            'has_more': has_more,
+            'next_cursor': encode_report_cursor(reports[-1]) if reports else None,
+            'prev_cursor': encode_report_cursor(reports[0]) if reports else None
+        }
         
+        # 初回同期を試みた応答は次回も同期させるためキャッシュしない
+        if initial_sync:
+            return with_version_headers(jsonify(payload), version_info)
+        return cache_json_response(key, payload, version_info, generation)
+    
     except Exception as e:
         print(f"❌ APIエラー: {e}")
         return jsonify({
@@ -273,69 +977,376 @@ def get_reports():
         }), 500
 
 
-@app.route('/api/duolingo/sync', methods=['POST'])
-def sync_reports():
-    """メール同期（Gmail → DB）"""
+def reports_etag(version_info):
+    """reportsの版数からETag生成"""
+    return f"reports-v{version_info['version']}"
+
+
+def is_not_modified(version_info):
+    """If-None-Match（優先）またはIf-Modified-Sinceが現在の版と一致するか判定"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(reports_etag(version_info))
+    if request.if_modified_since:
+        return version_info['updated_at'] <= request.if_modified_since.timestamp()
+    return False
+
+
+def with_version_headers(response, version_info):
+    """ETag（圧縮方式によらず同じ弱いETag）・Last-Modifiedを付与し、再利用時は毎回再検証させる"""
+    response.set_etag(reports_etag(version_info), weak=True)
+    response.last_modified = datetime.fromtimestamp(version_info['updated_at'], tz=timezone.utc)
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified_response(version_info):
+    """本文なしの304レスポンス"""
+    return with_version_headers(app.response_class(status=304), version_info)
+
+
+def response_cache_key():
+    """レスポンスキャッシュのキー（パスと並べ替えたクエリパラメータ）"""
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+
+def cached_response(key):
+    """キャッシュ済み本文があれば304または200を返す（なければNone）"""
+    entry = response_cache.get(key)
+    if entry is None:
+        return None
+    
+    body, version_info, encoded = entry
+    if is_not_modified(version_info):
+        return not_modified_response(version_info)
+    return encoded_json_response(body, version_info, encoded)
+
+
+def encoded_json_response(body, version_info, encoded):
+    """JSON本文のレスポンス生成（圧縮結果はencodedに方式ごとに保持して使い回す）"""
+    response = with_version_headers(app.response_class(body, mimetype='application/json'), version_info)
+    encoding = negotiate_encoding() if len(body) >= COMPRESS_MIN_SIZE else None
+    if encoding is None:
+        return response
+    if encoding not in encoded:
+        encoded[encoding] = compress_body(body, encoding)
+    return set_encoded_body(response, encoded[encoding], encoding)
+
+
+def cache_json_response(key, payload, version_info, generation):
+    """JSONをシリアライズしてキャッシュに格納し、レスポンスを返す"""
+    body = app.json.response(payload).get_data()
+    encoded = {}
+    response_cache.put(key, body, version_info, generation, encoded)
+    return encoded_json_response(body, version_info, encoded)
+
+
+def build_summary(stats, latest_reports):
+    """集計値と直近2週のレポートからサマリ生成（平均は1週あたり）"""
+    count = stats['count']
+    
+    def average(total, denominator):
+        return round(total / denominator, 1) if denominator else 0
+    
+    summary = {
+        'count': count,
+        'first_date': stats['first_date'],
+        'last_date': stats['last_date'],
+        'total_xp': stats['total_xp'],
+        'total_minutes': stats['total_minutes'],
+        'total_lessons': stats['total_lessons'],
+        'max_streak': stats['max_streak'],
+        'current_streak': latest_reports[0]['streak'] if latest_reports else 0,
+        'avg_xp_per_week': average(stats['total_xp'], count),
+        'avg_minutes_per_week': average(stats['total_minutes'], count),
+        'avg_lessons_per_week': average(stats['total_lessons'], count),
+        'avg_minutes_per_lesson': average(stats['total_minutes'], stats['total_lessons'])
+    }
+    
+    week_over_week = None
+    if len(latest_reports) >= 2:
+        current, previous = latest_reports[0], latest_reports[1]
+        week_over_week = {
+            'current': {key: current[key] for key in SUMMARY_METRICS},
+            'previous': {key: previous[key] for key in SUMMARY_METRICS},
+            'delta': {key: current[key] - previous[key] for key in SUMMARY_METRICS}
+        }
+    
+    return summary, week_over_week
+
+
+@app.route('/api/duolingo/summary', methods=['GET'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/summary', methods=['GET'])
+def get_summary(account_id):
+    """Duolingo学習サマリ取得（合計・平均・先週比・最大連続日数、group_byで週別/月別/年別）"""
+    key = response_cache_key()
+    response = cached_response(key)
+    if response is not None:
+        return response
+    
+    error = account_error_response(account_id)
+    if error is not None:
+        return error
+    
+    generation = response_cache.generation
+    group_by = request.args.get('group_by')
+    if group_by and group_by not in ROLLUP_PERIODS:
+        return jsonify({
+            'success': False,
+            'error': f"group_byは{'/'.join(ROLLUP_PERIODS)}で指定してください: {group_by}"
+        }), 400
+    
     try:
-        print("🔄 Gmail同期開始...")
-        
-        gmail_reports = get_duolingo_weekly_reports()
-        
-        if not gmail_reports:
-            print("⚠️ 新規レポートなし")
-            return jsonify({
-                'success': True,
-                'sync_info': {
-                    'new_records': 0,
-                    'total_records': count_reports()
-                },
-                'data': []
-            })
+        with connection(account_id=account_id) as conn:
+            version_info = get_reports_version(conn)
+            if is_not_modified(version_info):
+                return not_modified_response(version_info)
+            
+            stats = get_report_stats(conn)
+            latest_reports = get_reports_page(limit=2, conn=conn)
+            groups = get_report_stats_by_period(group_by, conn) if group_by else None
+    except Exception as e:
+        print(f"❌ APIエラー: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    summary, week_over_week = build_summary(stats, latest_reports)
+    
+    payload = {
+        'success': True,
+        'summary': summary,
+        'week_over_week': week_over_week
+    }
+    if groups is not None:
+        payload['group_by'] = group_by
+        payload['groups'] = groups
+    
+    return cache_json_response(key, payload, version_info, generation)
+
+
+@app.route('/api/duolingo/sync', methods=['POST'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/sync', methods=['POST'])
+def sync_reports(account_id):
+    """メール同期ジョブ開始（Gmail → DB、同じアカウントの実行中ジョブがあれば合流して202を返す）"""
+    error = account_error_response(account_id)
+    if error is not None:
+        return error
+    
+    full = request.args.get('full') == '1'
+    job, created = submit_sync(account_id, full=full)
+    
+    if created:
+        print(f"🔄 Gmail同期ジョブを開始: {job.id}")
+    else:
+        print(f"⏳ 実行中の同期ジョブに合流: {job.id}")
+    
+    response = jsonify({
+        'success': True,
+        'deduplicated': not created,
+        'job': job.to_dict()
+    })
+    response.status_code = 202
+    response.headers['Location'] = request.path + f'/{job.id}'
+    return response
+
+
+@app.route('/api/duolingo/sync/<job_id>', methods=['GET'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/sync/<job_id>', methods=['GET'])
+def get_sync_job(account_id, job_id):
+    """同期ジョブの状態・進捗（listed/fetched/parsed/inserted/errors）取得"""
+    job = sync_runner.get(job_id)
+    if job is None or job.params.get('account_id') != account_id:
+        return jsonify({
+            'success': False,
+            'error': f"同期ジョブが見つかりません: {job_id}"
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+
+def iter_export_lines(export_format, account_id=DEFAULT_ACCOUNT):
+    """全レポートをNDJSONまたはCSVの行としてfetchmany単位で逐次生成"""
+    with connection(account_id=account_id) as conn:
+        yield from iter_export_rows(export_format, conn)
+
+
+def iter_export_rows(export_format, conn):
+    """接続からレポートを読みNDJSONまたはCSVの行を生成"""
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(EXPORT_FIELDS)
         
-        db_reports = []
-        for report in gmail_reports:
-            if report.get('data'):
-                db_reports.append({
-                    'message_id': report['message_id'],
-                    'subject': report['subject'],
-                    'date': report['date'],
-                    'xp': report['data'].get('xp', 0),
-                    'minutes': report['data'].get('minutes', 0),
-                    'lessons': report['data'].get('lessons', 0),
-                    'streak': report['data'].get('streak', 0)
-                })
-        
-        new_count = insert_reports_bulk(db_reports)
-        
-        print(f"✅ {new_count}件の新規レポートを保存しました")
-        
-        all_reports = get_all_reports()
-        formatted_reports = []
-        for report in all_reports:
-            formatted_reports.append({
-                'date': report['date'],
-                'subject': report['subject'],
-                'xp': report['xp'],
-                'minutes': report['minutes'],
-                'lessons': report['lessons'],
-                'streak': report['streak']
-            })
+        for rows in iter_reports(conn=conn):
+            writer.writerows(map(row_getter(rows[0], EXPORT_FIELDS), rows))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
         
-        return jsonify({
-            'success': True,
-            'sync_info': {
-                'new_records': new_count,
-                'total_records': count_reports()
-            },
-            'data': formatted_reports
-        })
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+    
+    for rows in iter_reports(conn=conn):
+        values = row_getter(rows[0], EXPORT_FIELDS)
+        yield ''.join(app.json.dumps(dict(zip(EXPORT_FIELDS, values(row)))) + '\n' for row in rows)
+
+
+def iter_ndjson_reports(lines):
+    """NDJSONの行をレポート辞書として逐次解析（空行は無視、不正な行は行番号付きValueError）"""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        
+        try:
+            record = json.loads(line)
+            report = {field: record[field] for field in EXPORT_FIELDS}
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(f"{line_number}行目を読み込めません: {e}")
+        
+        # 型が違う値はINTEGER列に文字列が入ったり、NULLがINSERT OR IGNOREで黙って捨てられたりする
+        for field in EXPORT_TEXT_FIELDS:
+            if not isinstance(report[field], str):
+                raise ValueError(f"{line_number}行目の{field}は文字列で指定してください: {report[field]!r}")
+        for field in SUMMARY_METRICS:
+            if not isinstance(report[field], int) or isinstance(report[field], bool):
+                raise ValueError(f"{line_number}行目の{field}は整数で指定してください: {report[field]!r}")
         
+        yield report
+
+
+def import_ndjson_reports(lines, upsert=False, chunk_size=INSERT_CHUNK_SIZE, conn=None):
+    """NDJSONをchunk_size件ずつinsert_reports_bulkへ流し込み、件数を返す（失敗前のチャンクは保存済み）"""
+    counts = {'received': 0, 'inserted': 0}
+    chunk = []
+    
+    for report in iter_ndjson_reports(lines):
+        chunk.append(report)
+        counts['received'] += 1
+        if len(chunk) >= chunk_size:
+            counts['inserted'] += insert_reports_bulk(chunk, conn, upsert=upsert)
+            chunk = []
+    
+    if chunk:
+        counts['inserted'] += insert_reports_bulk(chunk, conn, upsert=upsert)
+    
+    return counts
+
+
+@app.route('/api/duolingo/export', methods=['GET'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/export', methods=['GET'])
+def export_reports(account_id):
+    """全レポートのエクスポート（?format=ndjson/csv、DBカーソルから逐次送信）"""
+    error = account_error_response(account_id)
+    if error is not None:
+        return error
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f"formatは{'/'.join(EXPORT_FORMATS)}で指定してください: {export_format}"
+        }), 400
+    
+    print(f"📤 レポートエクスポート開始（{export_format}）")
+    response = Response(iter_export_lines(export_format, account_id), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=duolingo_reports.{export_format}'
+    return response
+
+
+@app.route('/api/duolingo/import', methods=['POST'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/import', methods=['POST'])
+def import_reports(account_id):
+    """NDJSONのレポート一括インポート（リクエスト本文を逐次読み込み、?upsert=1で指標を更新）"""
+    error = account_error_response(account_id)
+    if error is not None:
+        return error
+    
+    upsert = request.args.get('upsert') == '1'
+    
+    try:
+        with connection(account_id=account_id) as conn:
+            counts = import_ndjson_reports(request.stream, upsert=upsert, conn=conn)
+    except ValueError as e:
+        print(f"❌ インポートエラー: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"❌ インポートエラー: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    print(f"📥 インポート完了: {counts['inserted']}/{counts['received']}件を新規保存")
+    return jsonify({
+        'success': True,
+        'import_info': counts
+    })
+
+
+@app.route('/api/duolingo/reparse', methods=['POST'], defaults={'account_id': DEFAULT_ACCOUNT})
+@app.route('/api/accounts/<account_id>/duolingo/reparse', methods=['POST'])
+def reparse_reports(account_id):
+    """保存済みの生メッセージからレポートを再解析（抽出ルール変更時、Gmail APIは使わない）"""
+    error = account_error_response(account_id)
+    if error is not None:
+        return error
+    
+    try:
+        counts = reparse_account(account_id)
     except Exception as e:
-        print(f"❌ 同期エラー: {e}")
+        print(f"❌ 再解析エラー: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    
+    print(f"🔁 再解析完了 {account_id}: {counts}")
+    return jsonify({
+        'success': True,
+        **counts
+    })
+
+
+@app.route('/api/accounts', methods=['GET'])
+def get_accounts():
+    """アカウント一覧取得"""
+    return jsonify({
+        'success': True,
+        'accounts': list_accounts()
+    })
+
+
+@app.route('/api/accounts', methods=['POST'])
+def create_account():
+    """アカウント作成（専用のDBを初期化、Gmail認証は python app.py auth <account_id> で実施）"""
+    account_id = (request.get_json(silent=True) or {}).get('account_id')
+    
+    try:
+        validate_account_id(account_id)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    created = not account_exists(account_id)
+    if created:
+        init_database(account_id)
+        print(f"👤 アカウントを作成しました: {account_id}")
+    
+    return jsonify({
+        'success': True,
+        'account_id': account_id,
+        'created': created
+    }), 201 if created else 200
 
 
 @app.route('/')
@@ -346,15 +1357,68 @@ def index():
         'version': '3.0 - SQLite Cache',
         'endpoints': {
             '/api/duolingo/reports': 'GET - ウィークリーレポート取得（DB優先）',
-            '/api/duolingo/sync': 'POST - メール同期（Gmail → DB）'
+            '/api/duolingo/summary': 'GET - 学習サマリ取得（?group_by=week/month/yearで期間別集計）',
+            '/api/duolingo/sync': 'POST - メール差分同期ジョブ開始（Gmail → DB、?full=1でフル同期）',
+            '/api/duolingo/sync/<job_id>': 'GET - 同期ジョブの状態・進捗取得',
+            '/api/duolingo/export': 'GET - 全レポートのエクスポート（?format=ndjson/csv）',
+            '/api/duolingo/import': 'POST - NDJSONのレポート一括インポート（?upsert=1で指標を更新）',
+            '/api/duolingo/reparse': 'POST - 保存済みの生メッセージからレポートを再解析（Gmail APIは使わない）',
+            '/api/accounts': 'GET - アカウント一覧 / POST - アカウント作成',
+            '/api/accounts/<account_id>/duolingo/...': '上記APIのアカウント別版（/api/duolingo/...は既定アカウント）'
         }
     })
 
 
+def run_auth_command(account_ids):
+    """python app.py auth [account_id ...]: ブラウザでGmail認証し、アカウントの認証情報を保存（未作成のアカウントは作成）"""
+    for account_id in account_ids or [DEFAULT_ACCOUNT]:
+        try:
+            validate_account_id(account_id)
+        except ValueError as e:
+            print(f"❌ {e}")
+            print("使い方: python app.py auth [account_id ...]")
+            sys.exit(2)
+        
+        created = not account_exists(account_id)
+        init_database(account_id)
+        if created:
+            print(f"👤 アカウントを作成しました: {account_id}")
+        if not ensure_gmail_auth(account_token_path(account_id)):
+            print(f"❌ {account_id}: 認証に失敗しました")
+            sys.exit(1)
+        print(f"✅ {account_id}: 認証情報を保存しました")
+
+
+def run_reparse_command(account_ids):
+    """python app.py reparse [account_id ...]: サーバーを起動せずに再解析（全CPUで並列）"""
+    # 起動中のサーバーはプロセス内のレスポンスキャッシュを破棄できないため、その場合はAPIを使う
+    parse_workers = PARSE_WORKERS or os.cpu_count() or 1
+    
+    for account_id in account_ids or list_accounts():
+        prepare_account(account_id)
+        init_database(account_id)
+        counts = reparse_account(account_id, parse_workers)
+        print(f"🔁 {account_id}: {counts['messages']}件を再解析（新規{counts['inserted']}件、抽出失敗{counts['errors']}件）")
+
+
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['auth']:
+        run_auth_command(sys.argv[2:])
+        sys.exit(0)
+    
+    if sys.argv[1:2] == ['reparse']:
+        run_reparse_command(sys.argv[2:])
+        sys.exit(0)
+    
     print("🚀 Duolingo BI API サーバー起動中...")
     print("📧 SQLite Cache有効")
     
-    init_database()
+    # 既存アカウントのDBにも追加されたテーブルを作成
+    for account_id in list_accounts():
+        init_database(account_id)
+    
+    # デバッグ時のリローダーは親プロセスでもここを通るため、実際に配信する子プロセスでのみ起動
+    if SYNC_SCHEDULE_ENABLED and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        sync_scheduler.start()
     
     app.run(debug=True, port=5000)
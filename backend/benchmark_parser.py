@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+パーサーのマイクロベンチマーク（本文/秒）
+
+使い方: python benchmark_parser.py [本文数] [本文の長さ倍率]
+"""
+import re
+import sys
+import time
+
+from duolingo_parser import parse_report
+
+
+WEEKLY_SUBJECTS = [
+    "週間レポート", "ウィークリーレポート", "Weekly Progress",
+    "進捗をチェック", "成果が積み重なって"
+]
+WEEKLY_PATTERNS = [r'\d+XP', r'\d+分', r'レッスン\s*\d+回', r'\d+日連続', r'Weekly Progress']
+
+
+def legacy_parse(subject, body):
+    """旧実装（判定5パス＋抽出4パス）"""
+    is_weekly = any(ws in subject for ws in WEEKLY_SUBJECTS) or \
+        sum(1 for pattern in WEEKLY_PATTERNS if re.search(pattern, body)) >= 3
+    
+    data = {}
+    for key, pattern in (
+        ('xp', r'(\d+)XP'),
+        ('minutes', r'(\d+)分'),
+        ('lessons', r'レッスン\s*(\d+)回'),
+        ('streak', r'(\d+)日連続')
+    ):
+        match = re.search(pattern, body)
+        if match:
+            data[key] = int(match.group(1))
+    
+    return is_weekly, (data if data else None)
+
+
+def make_bodies(count, scale):
+    """マーケティングメール風の本文を生成"""
+    filler = "Duolingoで毎日学習を続けましょう。新しいコースが追加されました。" * scale
+    return [
+        f"{filler} 今週の進捗はいかに {100 + i}XP {filler} {30 + i % 60}分 "
+        f"レッスン {i % 90}回 {filler} {i % 365}日連続記録 {filler}"
+        for i in range(count)
+    ]
+
+
+def measure(parse, bodies):
+    """本文/秒を計測"""
+    started = time.perf_counter()
+    for body in bodies:
+        parse("お知らせ", body)
+    elapsed = time.perf_counter() - started
+    return len(bodies) / elapsed
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    scale = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    
+    bodies = make_bodies(count, scale)
+    assert all(legacy_parse("お知らせ", b) == parse_report("お知らせ", b) for b in bodies[:100])
+    
+    print(f"📏 本文数: {count}件 / 平均長: {sum(map(len, bodies)) // count}文字")
+    
+    legacy = measure(legacy_parse, bodies)
+    single = measure(parse_report, bodies)
+    
+    print(f"🐢 旧実装（9パス）: {legacy:,.0f} 本文/秒")
+    print(f"🚀 1パス実装:       {single:,.0f} 本文/秒（{single / legacy:.1f}倍）")
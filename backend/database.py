@@ -4,84 +4,313 @@ SQLiteデータベース管理
 """
 import sqlite3
 import os
-from typing import List, Dict, Optional
+import sys
+import json
+import queue
+import re
+import threading
+import hashlib
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from email.utils import parsedate_to_datetime
 
 
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(DB_DIR, "duolingo_data.db")
 
+# 既定アカウントは従来のDB_PATH、それ以外はACCOUNTS_DIR/<account_id>/にDBと認証情報を置く
+DEFAULT_ACCOUNT = 'default'
+ACCOUNTS_DIR = os.path.join(DB_DIR, "accounts")
+ACCOUNT_DB_FILENAME = "duolingo_data.db"
+_ACCOUNT_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}')
 
-def get_connection() -> sqlite3.Connection:
-    """DB接続取得"""
-    conn = sqlite3.connect(DB_PATH)
+# 一括挿入で1トランザクションにまとめる件数
+INSERT_CHUNK_SIZE = 500
+
+# エクスポート時に1回のfetchmanyで読む件数
+EXPORT_BATCH_SIZE = 500
+
+# 生メッセージ（Gmail APIの本文レスポンス）のzlib圧縮レベル
+RAW_COMPRESS_LEVEL = 6
+
+# 集計テーブルの期間単位（UTC）とバケットキーのstrftime書式、開始時刻を求めるSQLiteの日付修飾子
+ROLLUP_PERIODS = {
+    'week': ('%Y-%m-%d', "'-6 days', 'weekday 1', 'start of day'"),
+    'month': ('%Y-%m', "'start of month'"),
+    'year': ('%Y', "'start of year'")
+}
+
+# 接続プールに保持する接続数
+POOL_SIZE = 4
+
+# 接続ごとに1回だけ適用するPRAGMA
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY"
+)
+
+# DBファイルごとの接続プールと、プール作成時のファイル識別子
+_pools: Dict[str, "queue.LifoQueue[sqlite3.Connection]"] = {}
+_pool_keys: Dict[str, Optional[Tuple[str, Optional[int]]]] = {}
+_pool_lock = threading.Lock()
+
+# reportsの変更コミット後に呼ぶ関数（プロセス内キャッシュの破棄など）
+_reports_change_listeners: List[Callable[[], None]] = []
+
+
+def add_reports_change_listener(listener: Callable[[], None]) -> None:
+    """reportsの行が追加・更新されコミットされた後に呼ぶ関数を登録"""
+    _reports_change_listeners.append(listener)
+
+
+def _notify_reports_changed() -> None:
+    for listener in list(_reports_change_listeners):
+        listener()
+
+
+def validate_account_id(account_id: str) -> str:
+    """アカウントID検証（英数字・_・-の64文字以内、パスとして安全なもののみ）"""
+    if not isinstance(account_id, str) or not _ACCOUNT_ID_RE.fullmatch(account_id):
+        raise ValueError(f"アカウントIDは英数字・_・-の64文字以内で指定してください: {account_id}")
+    return account_id
+
+
+def account_dir(account_id: str) -> str:
+    """アカウントのDB・認証情報を置くディレクトリ"""
+    return os.path.join(ACCOUNTS_DIR, validate_account_id(account_id))
+
+
+def account_db_path(account_id: Optional[str] = None) -> str:
+    """アカウントのDBファイルパス（既定アカウントはDB_PATH）"""
+    if account_id is None or account_id == DEFAULT_ACCOUNT:
+        return DB_PATH
+    return os.path.join(account_dir(account_id), ACCOUNT_DB_FILENAME)
+
+
+def account_exists(account_id: str) -> bool:
+    """アカウントのDBが作成済みか判定"""
+    return os.path.exists(account_db_path(account_id))
+
+
+def list_accounts() -> List[str]:
+    """既定アカウントと作成済みアカウントのID一覧"""
+    accounts = [DEFAULT_ACCOUNT]
+    if os.path.isdir(ACCOUNTS_DIR):
+        for name in sorted(os.listdir(ACCOUNTS_DIR)):
+            if _ACCOUNT_ID_RE.fullmatch(name) and name != DEFAULT_ACCOUNT and account_exists(name):
+                accounts.append(name)
+    return accounts
+
+
+def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    """DB接続取得（PRAGMA適用済みの新規接続、pathなしは既定アカウントのDB）"""
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def init_database() -> None:
-    """データベース初期化"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            message_id TEXT PRIMARY KEY,
-            subject TEXT NOT NULL,
-            date TEXT NOT NULL,
-            xp INTEGER NOT NULL,
-            minutes INTEGER NOT NULL,
-            lessons INTEGER NOT NULL,
-            streak INTEGER NOT NULL
-        )
-    """)
+def _db_file_key(path: str) -> Tuple[str, Optional[int]]:
+    """DBファイルの識別子（削除・差し替えの検知用）"""
+    try:
+        return path, os.stat(path).st_ino
+    except FileNotFoundError:
+        return path, None
+
+
+def _close_pooled_connections(path: str) -> None:
+    pool = _pools.get(path)
+    while pool is not None:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+def close_all_connections() -> None:
+    """全DBファイルのプール内の接続をすべて閉じる"""
+    with _pool_lock:
+        for path in list(_pools):
+            _close_pooled_connections(path)
+        _pools.clear()
+        _pool_keys.clear()
+
+
+def _acquire_connection(path: str) -> sqlite3.Connection:
+    with _pool_lock:
+        # DBファイルが削除・差し替えられていたら古い接続は使わない
+        if _db_file_key(path) != _pool_keys.get(path):
+            _close_pooled_connections(path)
+        
+        try:
+            return _pools.setdefault(path, queue.LifoQueue()).get_nowait()
+        except queue.Empty:
+            conn = get_connection(path)
+            _pool_keys[path] = _db_file_key(path)
+            return conn
+
+
+def _release_connection(conn: sqlite3.Connection, path: str) -> None:
+    if conn.in_transaction:
+        conn.rollback()
     
-    conn.commit()
-    conn.close()
+    with _pool_lock:
+        pool = _pools.setdefault(path, queue.LifoQueue())
+        if pool.qsize() >= POOL_SIZE or _db_file_key(path) != _pool_keys.get(path):
+            conn.close()
+        else:
+            pool.put(conn)
 
 
-def insert_report(report: Dict) -> bool:
-    """レポート挿入"""
-    conn = get_connection()
-    cursor = conn.cursor()
+@contextmanager
+def connection(
+    conn: Optional[sqlite3.Connection] = None,
+    account_id: Optional[str] = None
+) -> Iterator[sqlite3.Connection]:
+    """アカウントのDBのプールから接続を借りる（connが渡されればそれをそのまま使う）"""
+    if conn is not None:
+        yield conn
+        return
     
+    path = account_db_path(account_id)
+    pooled = _acquire_connection(path)
     try:
+        yield pooled
+    finally:
+        _release_connection(pooled, path)
+
+
+def init_database(account_id: Optional[str] = None) -> None:
+    """データベース初期化（アカウント指定時はアカウント用ディレクトリも作成）"""
+    os.makedirs(os.path.dirname(account_db_path(account_id)), exist_ok=True)
+    
+    with connection(account_id=account_id) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reports (
+                message_id TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                date TEXT NOT NULL,
+                xp INTEGER NOT NULL,
+                minutes INTEGER NOT NULL,
+                lessons INTEGER NOT NULL,
+                streak INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        
+        migrate_database(conn)
+        
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reports_timestamp
+            ON reports (timestamp)
+        """)
+        
         cursor.execute("""
-            INSERT OR IGNORE INTO reports 
-            (message_id, subject, date, xp, minutes, lessons, streak)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            report['message_id'],
-            report['subject'],
-            report['date'],
-            report['xp'],
-            report['minutes'],
-            report['lessons'],
-            report['streak']
-        ))
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                history_id TEXT NOT NULL,
+                watermark INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS report_rollups (
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                start_timestamp INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                total_xp INTEGER NOT NULL,
+                total_minutes INTEGER NOT NULL,
+                total_lessons INTEGER NOT NULL,
+                max_streak INTEGER NOT NULL,
+                PRIMARY KEY (period, bucket)
+            ) WITHOUT ROWID
+        """)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS raw_messages (
+                message_id TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                date TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                stored_at INTEGER NOT NULL
+            )
+        """)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reports_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO reports_version (id, version, updated_at)
+            VALUES (1, 0, CAST(strftime('%s', 'now') AS INTEGER))
+        """)
         
         conn.commit()
-        inserted = cursor.rowcount > 0
-        conn.close()
-        return inserted
         
-    except Exception as e:
-        conn.close()
-        raise e
+        # 集計テーブル追加前のDBは初回のみ全件から構築
+        cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM reports) AND NOT EXISTS (SELECT 1 FROM report_rollups) AS needs_rebuild
+        """)
+        if cursor.fetchone()['needs_rebuild']:
+            rebuild_rollups(conn)
+
+
+def to_timestamp(date: str) -> int:
+    """RFC 2822の日付文字列をUNIX秒に変換（タイムゾーンなしはUTC扱い、解析不能は0）"""
+    try:
+        parsed = parsedate_to_datetime(date)
+    except (TypeError, ValueError):
+        return 0
+    
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
 
 
-def insert_reports_bulk(reports: List[Dict]) -> int:
-    """レポート一括挿入"""
-    conn = get_connection()
+def migrate_database(conn: sqlite3.Connection) -> None:
+    """既存DBのスキーマ移行（timestamp列の追加と値の埋め戻し）"""
     cursor = conn.cursor()
-    inserted_count = 0
     
-    try:
-        for report in reports:
+    cursor.execute("PRAGMA table_info(reports)")
+    columns = {row['name'] for row in cursor.fetchall()}
+    
+    if 'timestamp' not in columns:
+        print("🛠️ reportsテーブルにtimestamp列を追加します...")
+        cursor.execute("ALTER TABLE reports ADD COLUMN timestamp INTEGER NOT NULL DEFAULT 0")
+        
+        cursor.execute("SELECT message_id, date FROM reports")
+        rows = cursor.fetchall()
+        cursor.executemany(
+            "UPDATE reports SET timestamp = ? WHERE message_id = ?",
+            [(to_timestamp(row['date']), row['message_id']) for row in rows]
+        )
+        print(f"✅ {len(rows)}件のtimestampを埋め戻しました")
+
+
+def insert_report(report: Dict, conn: Optional[sqlite3.Connection] = None) -> bool:
+    """レポート挿入"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        try:
             cursor.execute("""
                 INSERT OR IGNORE INTO reports 
-                (message_id, subject, date, xp, minutes, lessons, streak)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                (message_id, subject, date, xp, minutes, lessons, streak, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 report['message_id'],
                 report['subject'],
@@ -89,72 +318,546 @@ def insert_reports_bulk(reports: List[Dict]) -> int:
                 report['xp'],
                 report['minutes'],
                 report['lessons'],
-                report['streak']
+                report['streak'],
+                to_timestamp(report['date'])
             ))
             
-            if cursor.rowcount > 0:
-                inserted_count += 1
+            inserted = cursor.rowcount > 0
+            if inserted:
+                refresh_rollups(conn, [to_timestamp(report['date'])])
+                bump_reports_version(conn)
+            
+            conn.commit()
+            if inserted:
+                _notify_reports_changed()
+            return inserted
         
-        conn.commit()
-        conn.close()
-        return inserted_count
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+
+def _report_row(report: Dict) -> tuple:
+    return (
+        report['message_id'],
+        report['subject'],
+        report['date'],
+        report['xp'],
+        report['minutes'],
+        report['lessons'],
+        report['streak'],
+        to_timestamp(report['date'])
+    )
+
+
+def insert_reports_bulk(
+    reports: List[Dict],
+    conn: Optional[sqlite3.Connection] = None,
+    upsert: bool = False,
+    chunk_size: int = INSERT_CHUNK_SIZE
+) -> int:
+    """レポート一括挿入（chunk_size件ずつ集計テーブルと同じトランザクションでコミット、upsert=Trueなら既存の指標を更新）して新規件数を返す"""
+    with connection(conn) as conn:
+        inserted_count = 0
+        updated_count = 0
         
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        raise e
+        for start in range(0, len(reports), chunk_size):
+            chunk = reports[start:start + chunk_size]
+            
+            try:
+                rows = [_report_row(report) for report in chunk]
+                
+                chunk_before = conn.total_changes
+                conn.executemany("""
+                    INSERT OR IGNORE INTO reports 
+                    (message_id, subject, date, xp, minutes, lessons, streak, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                inserted_count += conn.total_changes - chunk_before
+                
+                if upsert:
+                    before = conn.total_changes
+                    conn.executemany("""
+                        UPDATE reports
+                        SET xp = ?, minutes = ?, lessons = ?, streak = ?
+                        WHERE message_id = ?
+                          AND (xp != ? OR minutes != ? OR lessons != ? OR streak != ?)
+                    """, [
+                        (
+                            report['xp'], report['minutes'], report['lessons'], report['streak'],
+                            report['message_id'],
+                            report['xp'], report['minutes'], report['lessons'], report['streak']
+                        )
+                        for report in chunk
+                    ])
+                    updated_count += conn.total_changes - before
+                
+                # 追加・更新があったチャンクだけ該当バケットを再集計
+                changed = conn.total_changes > chunk_before
+                if changed:
+                    refresh_rollups(conn, [row[-1] for row in rows])
+                    bump_reports_version(conn)
+                
+                conn.commit()
+                if changed:
+                    _notify_reports_changed()
+            
+            except Exception as e:
+                conn.rollback()
+                raise e
+        
+        if updated_count:
+            print(f"♻️ {updated_count}件のレポートの指標を更新しました")
+        
+        return inserted_count
 
 
-def get_all_reports() -> List[Dict]:
-    """全レポート取得（日付降順）"""
-    conn = get_connection()
+def rollup_bucket(period: str, timestamp: int) -> Tuple[str, int, int]:
+    """timestampを含む集計バケットのキーと範囲[開始, 終了)をUNIX秒で返す（UTC、週は月曜始まり）"""
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        end = start + timedelta(days=7)
+    elif period == 'month':
+        start = day.replace(day=1)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    else:
+        start = day.replace(month=1, day=1)
+        end = start.replace(year=start.year + 1)
+    
+    return start.strftime(ROLLUP_PERIODS[period][0]), int(start.timestamp()), int(end.timestamp())
+
+
+def refresh_rollups(conn: sqlite3.Connection, timestamps: List[int]) -> None:
+    """timestampsを含むバケットだけをreportsから再集計（コミットは呼び出し側）"""
+    buckets = {
+        (period, *rollup_bucket(period, timestamp))
+        for timestamp in set(timestamps)
+        for period in ROLLUP_PERIODS
+    }
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT message_id, subject, date, xp, minutes, lessons, streak
-        FROM reports
+    for period, bucket, start, end in buckets:
+        cursor.execute("""
+            SELECT
+                COUNT(*) AS count,
+                COALESCE(SUM(xp), 0) AS total_xp,
+                COALESCE(SUM(minutes), 0) AS total_minutes,
+                COALESCE(SUM(lessons), 0) AS total_lessons,
+                COALESCE(MAX(streak), 0) AS max_streak
+            FROM reports
+            WHERE timestamp >= ? AND timestamp < ?
+        """, (start, end))
+        row = cursor.fetchone()
+        
+        if row['count'] == 0:
+            cursor.execute("DELETE FROM report_rollups WHERE period = ? AND bucket = ?", (period, bucket))
+            continue
+        
+        cursor.execute("""
+            INSERT INTO report_rollups
+            (period, bucket, start_timestamp, count, total_xp, total_minutes, total_lessons, max_streak)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(period, bucket) DO UPDATE SET
+                count = excluded.count,
+                total_xp = excluded.total_xp,
+                total_minutes = excluded.total_minutes,
+                total_lessons = excluded.total_lessons,
+                max_streak = excluded.max_streak
+        """, (period, bucket, start, *row))
+
+
+def rebuild_rollups(conn: Optional[sqlite3.Connection] = None) -> int:
+    """集計テーブルをreports全件から再構築してバケット数を返す"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM report_rollups")
+            
+            for period, (bucket_format, modifiers) in ROLLUP_PERIODS.items():
+                cursor.execute(f"""
+                    INSERT INTO report_rollups
+                    (period, bucket, start_timestamp, count, total_xp, total_minutes, total_lessons, max_streak)
+                    SELECT
+                        ?,
+                        strftime(?, start_timestamp, 'unixepoch'),
+                        start_timestamp,
+                        COUNT(*),
+                        SUM(xp),
+                        SUM(minutes),
+                        SUM(lessons),
+                        MAX(streak)
+                    FROM (
+                        SELECT
+                            CAST(strftime('%s', timestamp, 'unixepoch', {modifiers}) AS INTEGER) AS start_timestamp,
+                            xp, minutes, lessons, streak
+                        FROM reports
+                    )
+                    GROUP BY start_timestamp
+                """, (period, bucket_format))
+            
+            cursor.execute("SELECT COUNT(*) AS count FROM report_rollups")
+            bucket_count = cursor.fetchone()['count']
+            
+            conn.commit()
+            return bucket_count
+        
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+
+def bump_reports_version(conn: sqlite3.Connection) -> None:
+    """reportsの変更を版数に反映（コミットは呼び出し側）"""
+    conn.execute("""
+        UPDATE reports_version
+        SET version = version + 1, updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+        WHERE id = 1
     """)
+
+
+def get_reports_version(conn: Optional[sqlite3.Connection] = None) -> Dict:
+    """reportsの版数と最終更新UNIX秒を取得（主キー1行の参照のみ）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT version, updated_at FROM reports_version WHERE id = 1")
+        
+        row = cursor.fetchone()
     
-    rows = cursor.fetchall()
-    conn.close()
+    return dict(row) if row else {'version': 0, 'updated_at': 0}
+
+
+def encode_raw_message(message: Dict) -> Tuple[str, bytes]:
+    """生メッセージを正規化したJSONのSHA-256とzlib圧縮した本体に変換"""
+    data = json.dumps(message, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(data).hexdigest(), zlib.compress(data, RAW_COMPRESS_LEVEL)
+
+
+def decode_raw_message(payload: bytes) -> Dict:
+    """zlib圧縮した生メッセージを復元"""
+    return json.loads(zlib.decompress(payload))
+
+
+def save_raw_messages(messages: List[Dict], conn: Optional[sqlite3.Connection] = None) -> int:
+    """生メッセージ（message_id・subject・date・message）を圧縮して保存し、追加・更新件数を返す（内容が同じなら書き換えない）"""
+    if not messages:
+        return 0
     
-    reports = [dict(row) for row in rows]
+    rows = []
+    for message in messages:
+        digest, payload = encode_raw_message(message['message'])
+        rows.append((message['message_id'], message['subject'], message['date'], digest, payload))
     
-    reports.sort(key=lambda x: parsedate_to_datetime(x['date']), reverse=True)
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        before = conn.total_changes
+        
+        cursor.executemany("""
+            INSERT INTO raw_messages (message_id, subject, date, sha256, payload, stored_at)
+            VALUES (?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT (message_id) DO UPDATE SET
+                subject = excluded.subject,
+                date = excluded.date,
+                sha256 = excluded.sha256,
+                payload = excluded.payload,
+                stored_at = excluded.stored_at
+            WHERE raw_messages.sha256 != excluded.sha256
+        """, rows)
+        
+        conn.commit()
+        return conn.total_changes - before
+
+
+def iter_raw_messages(
+    batch_size: int = EXPORT_BATCH_SIZE,
+    conn: Optional[sqlite3.Connection] = None
+) -> Iterator[List[sqlite3.Row]]:
+    """保存済みの生メッセージ（圧縮のまま）をbatch_size件ずつ逐次取得"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT message_id, subject, date, payload
+            FROM raw_messages
+            ORDER BY message_id
+        """)
+        
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def count_raw_messages(conn: Optional[sqlite3.Connection] = None) -> int:
+    """保存済みの生メッセージ件数取得"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) as count FROM raw_messages")
+        
+        row = cursor.fetchone()
     
-    return reports
+    return row['count']
 
 
-def get_latest_date() -> Optional[str]:
-    """最新のレポート日付取得"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def filter_new_message_ids(
+    message_ids: List[str],
+    conn: Optional[sqlite3.Connection] = None,
+    require_raw: bool = False
+) -> List[str]:
+    """未保存のmessage_idのみ抽出（1クエリ、入力順を維持、require_raw=Trueなら生メッセージ未保存のものも残す）"""
+    if not message_ids:
+        return []
+    
+    # 生メッセージを保存する前に取り込んだレポートは、フル同期で本文を取り直して保存する
+    saved_table = 'raw_messages' if require_raw else 'reports'
+    
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT ids.value AS message_id
+            FROM json_each(?) AS ids
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {saved_table} WHERE {saved_table}.message_id = ids.value
+            )
+            ORDER BY ids.key
+        """, (json.dumps(list(message_ids)),))
+        
+        rows = cursor.fetchall()
+    
+    return [row['message_id'] for row in rows]
+
+
+def get_all_reports(conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
+    """全レポート取得（日付降順）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT message_id, subject, date, xp, minutes, lessons, streak
+            FROM reports
+            ORDER BY timestamp DESC, rowid DESC
+        """)
+        
+        rows = cursor.fetchall()
+    
+    return [dict(row) for row in rows]
+
+
+def iter_reports(
+    batch_size: int = EXPORT_BATCH_SIZE,
+    conn: Optional[sqlite3.Connection] = None
+) -> Iterator[List[sqlite3.Row]]:
+    """全レポートを日付昇順にbatch_size件ずつ逐次取得（接続は走査の間だけ保持）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT message_id, subject, date, xp, minutes, lessons, streak, timestamp
+            FROM reports
+            ORDER BY timestamp ASC, rowid ASC
+        """)
+        
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def get_reports_page(
+    limit: Optional[int] = None,
+    before: Optional[Tuple[int, int]] = None,
+    after: Optional[Tuple[int, int]] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    conn: Optional[sqlite3.Connection] = None
+) -> List[sqlite3.Row]:
+    """レポートを(timestamp, rowid)のキーセットでページ取得（日付降順、sinceは以上・untilは未満、rowidは_row_id列）"""
+    conditions = []
+    params: List = []
+    
+    if before is not None:
+        conditions.append("(timestamp, rowid) < (?, ?)")
+        params.extend(before)
+    if after is not None:
+        conditions.append("(timestamp, rowid) > (?, ?)")
+        params.extend(after)
+    if since is not None:
+        conditions.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("timestamp < ?")
+        params.append(until)
     
-    cursor.execute("""
-        SELECT date
+    # afterは古い側から辿ってから並べ替え、カーソル直後のlimit件を返す
+    order = "ASC" if after is not None and before is None else "DESC"
+    query = f"""
+        SELECT rowid AS _row_id, message_id, subject, date, xp, minutes, lessons, streak, timestamp
         FROM reports
-    """)
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY timestamp {order}, rowid {order}
+    """
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
     
-    rows = cursor.fetchall()
-    conn.close()
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute(query, params)
+        
+        rows = cursor.fetchall()
+    
+    # sqlite3.Rowのまま返し、APIで返す列は呼び出し側で選ぶ
+    if order == "ASC":
+        rows.reverse()
+    return rows
+
+
+def get_latest_timestamp(conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+    """最新レポートのtimestamp取得（インデックスのMAXで1回の探索）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT MAX(timestamp) AS latest FROM reports")
+        
+        row = cursor.fetchone()
     
-    if not rows:
-        return None
+    return row['latest']
+
+
+def get_latest_date(conn: Optional[sqlite3.Connection] = None) -> Optional[str]:
+    """最新のレポート日付取得"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT date
+            FROM reports
+            WHERE timestamp = (SELECT MAX(timestamp) FROM reports)
+            LIMIT 1
+        """)
+        
+        row = cursor.fetchone()
     
-    dates = [dict(row)['date'] for row in rows]
-    dates.sort(key=lambda x: parsedate_to_datetime(x), reverse=True)
+    return row['date'] if row else None
+
+
+def get_report_stats(conn: Optional[sqlite3.Connection] = None) -> Dict:
+    """件数・最古/最新日付・合計値を1クエリで取得"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT
+                COUNT(*) AS count,
+                MIN(timestamp) AS first_timestamp,
+                MAX(timestamp) AS last_timestamp,
+                (SELECT date FROM reports ORDER BY timestamp ASC LIMIT 1) AS first_date,
+                (SELECT date FROM reports ORDER BY timestamp DESC LIMIT 1) AS last_date,
+                COALESCE(SUM(xp), 0) AS total_xp,
+                COALESCE(SUM(minutes), 0) AS total_minutes,
+                COALESCE(SUM(lessons), 0) AS total_lessons,
+                COALESCE(MAX(streak), 0) AS max_streak
+            FROM reports
+        """)
+        
+        row = cursor.fetchone()
     
-    return dates[0]
+    return dict(row)
 
 
-def count_reports() -> int:
-    """レポート件数取得"""
-    conn = get_connection()
-    cursor = conn.cursor()
+def get_report_stats_by_period(period: str, conn: Optional[sqlite3.Connection] = None) -> List[Dict]:
+    """週別・月別・年別（UTC）の件数・合計値・最大連続日数を集計テーブルから取得（古い順）"""
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"periodは{'/'.join(ROLLUP_PERIODS)}で指定してください: {period}")
     
-    cursor.execute("SELECT COUNT(*) as count FROM reports")
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT bucket AS period, start_timestamp, count, total_xp, total_minutes, total_lessons, max_streak
+            FROM report_rollups
+            WHERE period = ?
+            ORDER BY bucket ASC
+        """, (period,))
+        
+        rows = cursor.fetchall()
     
-    row = cursor.fetchone()
-    conn.close()
+    return [dict(row) for row in rows]
+
+
+def count_reports(conn: Optional[sqlite3.Connection] = None) -> int:
+    """レポート件数取得"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) as count FROM reports")
+        
+        row = cursor.fetchone()
     
     return row['count']
+
+
+def get_sync_cursor(conn: Optional[sqlite3.Connection] = None) -> Optional[Dict]:
+    """同期カーソル取得（未同期ならNone）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT history_id, watermark, updated_at
+            FROM sync_state
+            WHERE id = 1
+        """)
+        
+        row = cursor.fetchone()
+    
+    return dict(row) if row else None
+
+
+def save_sync_cursor(history_id: str, watermark: int, conn: Optional[sqlite3.Connection] = None) -> None:
+    """同期カーソル保存（historyIdと基準日時のUNIX秒）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO sync_state (id, history_id, watermark, updated_at)
+            VALUES (1, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                history_id = excluded.history_id,
+                watermark = excluded.watermark,
+                updated_at = excluded.updated_at
+        """, (str(history_id), int(watermark), datetime.now(timezone.utc).isoformat()))
+        
+        conn.commit()
+
+
+def clear_sync_cursor(conn: Optional[sqlite3.Connection] = None) -> None:
+    """同期カーソル削除（次回はフル同期）"""
+    with connection(conn) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM sync_state")
+        
+        conn.commit()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    
+    if command == 'rebuild-rollups':
+        accounts = sys.argv[2:] or list_accounts()
+        for account_id in accounts:
+            init_database(account_id)
+            with connection(account_id=account_id) as conn:
+                print(f"✅ {account_id}: 集計テーブルを再構築しました: {rebuild_rollups(conn)}バケット")
+    else:
+        print("使い方: python database.py rebuild-rollups [account_id ...]")
+        sys.exit(1)
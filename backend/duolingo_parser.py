@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Duolingoウィークリーレポート解析（本文抽出、判定と数値抽出を1パスで行う共通パーサー）
+"""
+import base64
+import codecs
+import html
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+WEEKLY_SUBJECTS = (
+    "週間レポート", "ウィークリーレポート", "Weekly Progress",
+    "進捗をチェック", "成果が積み重なって"
+)
+
+METRIC_KEYS = ('xp', 'minutes', 'lessons', 'streak')
+
+# 本文判定に必要な一致パターン数（5種類中）
+WEEKLY_PATTERN_THRESHOLD = 3
+
+# base64本文を逐次デコードする単位（4の倍数）
+BODY_DECODE_CHUNK = 16 * 1024
+
+# タグは<の直後が英字・/・!・?のときだけ（「<3分」のような本文中の<は文字として残す）
+_HTML_TAG_RE = re.compile(r'<[A-Za-z/!?][^>]*>')
+_HTML_TAG_START_RE = re.compile(r'<[A-Za-z/!?]')
+
+# 中身ごと読み飛ばすブロック（style/script、コメント）の開始と終了
+_HTML_SKIP_OPEN_RE = re.compile(r'<(style|script)\b[^>]*>|<!--', re.IGNORECASE)
+_HTML_SKIP_CLOSE_RES = {
+    'style': re.compile(r'</style\s*>', re.IGNORECASE),
+    'script': re.compile(r'</script\s*>', re.IGNORECASE),
+    None: re.compile(r'-->')
+}
+# 終了タグが断片をまたぐ場合に備えて持ち越す末尾の文字数
+_HTML_SKIP_CLOSE_KEEP = 16
+
+# 逐次走査でチャンク境界をまたぐ指標を拾うために重ねて見る文字数
+_SCAN_OVERLAP = 64
+
+_SUBJECT_RE = re.compile('|'.join(re.escape(subject) for subject in WEEKLY_SUBJECTS))
+
+# 数値で始まる指標は数値の後ろの単位で分岐させ、1回のfinditerで全指標を拾う。
+# 各指標の末尾は数字以外なので、最初の一致は個別にre.searchした場合と同じ位置になる
+_BODY_RE = re.compile(
+    r'(?P<value>\d++)(?:(?P<xp>XP)|(?P<minutes>分)|(?P<streak>日連続))'
+    r'|レッスン\s*(?P<lessons>\d++)回'
+    r'|(?P<weekly>Weekly Progress)'
+)
+
+
+def scan_body(body: str) -> Tuple[Dict[str, int], int]:
+    """本文を1パスで走査し、各指標の最初の値と一致したパターン種類数を返す"""
+    data: Dict[str, int] = {}
+    found = set()
+    
+    for match in _BODY_RE.finditer(body):
+        key = match.lastgroup
+        if key in found:
+            continue
+        
+        found.add(key)
+        if key == 'lessons':
+            data[key] = int(match.group('lessons'))
+        elif key != 'weekly':
+            data[key] = int(match.group('value'))
+        
+        # 4指標が揃えば判定閾値も満たすので残りは走査しない
+        if len(data) == len(METRIC_KEYS):
+            break
+    
+    return data, len(found)
+
+
+def parse_report(subject: str, body: str) -> Tuple[bool, Optional[Dict[str, int]]]:
+    """ウィークリーレポート判定と学習データ抽出を同時に行う"""
+    data, matches = scan_body(body)
+    is_weekly = bool(_SUBJECT_RE.search(subject)) or matches >= WEEKLY_PATTERN_THRESHOLD
+    return is_weekly, (data if data else None)
+
+
+def is_weekly_report(subject: str, body: str) -> bool:
+    """ウィークリーレポート確定判定"""
+    if _SUBJECT_RE.search(subject):
+        return True
+    
+    _, matches = scan_body(body)
+    return matches >= WEEKLY_PATTERN_THRESHOLD
+
+
+def extract_duolingo_data(body: str) -> Optional[Dict[str, int]]:
+    """Duolingo学習データ抽出"""
+    data, _ = scan_body(body)
+    return data if data else None
+
+
+class _HTMLTextExtractor:
+    """HTMLを逐次受け取りテキストのみをchunksへ追加（style/script・コメントは読み飛ばす）"""
+    
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        # タグ境界より後ろのテキストは単語の途中で切らないよう次回に持ち越す
+        self.carry = ''
+        self.skip_close = None
+    
+    def _append_text(self, segment: str) -> None:
+        # タグは空白1つ、連続する空白も1つにまとめる
+        text = ' '.join(html.unescape(_HTML_TAG_RE.sub(' ', segment)).split())
+        if text:
+            self.chunks.append(' ' + text)
+    
+    def feed(self, data: str) -> None:
+        """HTML断片を追加"""
+        buffer = self.carry + data
+        self.carry = ''
+        
+        while buffer:
+            if self.skip_close is not None:
+                match = self.skip_close.search(buffer)
+                if match is None:
+                    self.carry = buffer[-_HTML_SKIP_CLOSE_KEEP:]
+                    return
+                buffer = buffer[match.end():]
+                self.skip_close = None
+                continue
+            
+            match = _HTML_SKIP_OPEN_RE.search(buffer)
+            if match is None:
+                cut = buffer.rfind('>') + 1
+                self._append_text(buffer[:cut])
+                self.carry = buffer[cut:]
+                return
+            
+            self._append_text(buffer[:match.start()])
+            self.skip_close = _HTML_SKIP_CLOSE_RES[match.group(1) and match.group(1).lower()]
+            buffer = buffer[match.end():]
+    
+    def close(self) -> None:
+        """閉じていないタグを除いた残りのテキストを追加"""
+        if self.skip_close is None and self.carry:
+            match = _HTML_TAG_START_RE.search(self.carry)
+            self._append_text(self.carry if match is None else self.carry[:match.start()])
+        
+        self.carry = ''
+        self.skip_close = None
+
+
+class _MetricTracker:
+    """追加されたテキストだけを走査し、全指標が揃ったかを判定"""
+    
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+        self.scanned = 0
+        self.tail = ''
+        self.found = set()
+    
+    def complete(self) -> bool:
+        text = self.tail + ''.join(self.chunks[self.scanned:])
+        self.scanned = len(self.chunks)
+        
+        data, _ = scan_body(text)
+        self.found.update(data)
+        self.tail = text[-_SCAN_OVERLAP:]
+        
+        return len(self.found) == len(METRIC_KEYS)
+
+
+def iter_decoded_text(data: str) -> Iterator[str]:
+    """base64url本文をBODY_DECODE_CHUNKずつUTF-8デコード"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    
+    for start in range(0, len(data), BODY_DECODE_CHUNK):
+        text = decoder.decode(base64.urlsafe_b64decode(data[start:start + BODY_DECODE_CHUNK]))
+        if text:
+            yield text
+    
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def extract_email_body(msg: Dict) -> str:
+    """メール本文抽出（逐次デコード、全指標が揃った時点で打ち切り）"""
+    chunks: List[str] = []
+    tracker = _MetricTracker(chunks)
+    stack = [msg['payload']]
+    
+    while stack:
+        payload = stack.pop()
+        
+        if 'parts' in payload:
+            stack.extend(reversed(payload['parts']))
+            continue
+        
+        mime_type = payload.get('mimeType')
+        data = payload.get('body', {}).get('data')
+        if not data or mime_type not in ('text/plain', 'text/html'):
+            continue
+        
+        if mime_type == 'text/plain':
+            for text in iter_decoded_text(data):
+                chunks.append(text)
+                if tracker.complete():
+                    return ''.join(chunks).strip()
+        else:
+            parser = _HTMLTextExtractor(chunks)
+            for text in iter_decoded_text(data):
+                parser.feed(text)
+                if tracker.complete():
+                    return ''.join(chunks).strip()
+            parser.close()
+    
+    return ''.join(chunks).strip()
+
+
+def parse_message(msg: Dict) -> Optional[Dict[str, int]]:
+    """取得済みメッセージから学習データ抽出（プロセスプールから呼べるトップレベル関数）"""
+    return extract_duolingo_data(extract_email_body(msg))
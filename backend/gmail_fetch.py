@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Gmail APIメッセージ取得（ページング・バッチリクエスト・並列取得・履歴同期）
+"""
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+
+# Gmailのバッチは1リクエスト最大100件、推奨は50件
+BATCH_CHUNK_SIZE = 50
+BATCH_MAX_SIZE = 100
+BATCH_MAX_RETRIES = 3
+BATCH_RETRY_DELAY = 1.0
+
+# messages.listの1ページ件数（最大500）
+LIST_PAGE_SIZE = 100
+
+# 並列取得（Gmailのユーザー単位クォータは250ユニット/秒、messages.getは5ユニット）
+FETCH_MAX_WORKERS = 8
+FETCH_MAX_RETRIES = 5
+BACKOFF_BASE_DELAY = 1.0
+BACKOFF_MAX_DELAY = 32.0
+QUOTA_UNITS_PER_SECOND = 250
+MESSAGE_GET_QUOTA_UNITS = 5
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_retryable_error(exception: Exception) -> bool:
+    """再試行対象のエラーか判定"""
+    if isinstance(exception, HttpError):
+        return exception.resp.status in RETRYABLE_STATUSES
+    return False
+
+
+def fetch_messages_batch(
+    service,
+    message_ids: List[str],
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    max_retries: int = BATCH_MAX_RETRIES,
+    retry_delay: float = BATCH_RETRY_DELAY,
+    **get_kwargs
+) -> Dict[str, Dict]:
+    """メッセージ一括取得（chunk_size件ずつバッチ送信、失敗分は再試行）"""
+    if not 1 <= chunk_size <= BATCH_MAX_SIZE:
+        raise ValueError(f"chunk_sizeは1〜{BATCH_MAX_SIZE}で指定してください: {chunk_size}")
+    
+    fetched: Dict[str, Dict] = {}
+    pending = list(dict.fromkeys(message_ids))
+    attempt = 0
+    
+    while pending:
+        if attempt > 0:
+            delay = retry_delay * (2 ** (attempt - 1))
+            print(f"🔁 バッチ再試行 {attempt}/{max_retries}: {len(pending)}件（{delay:.1f}秒待機）")
+            time.sleep(delay)
+        
+        failed: List[str] = []
+        
+        def callback(request_id: str, response: Optional[Dict], exception: Optional[Exception]) -> None:
+            if exception is None:
+                fetched[request_id] = response
+            elif is_retryable_error(exception):
+                failed.append(request_id)
+            else:
+                print(f"⚠️ メッセージ取得失敗 {request_id}: {exception}")
+        
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for message_id in chunk:
+                batch.add(
+                    service.users().messages().get(userId='me', id=message_id, **get_kwargs),
+                    request_id=message_id
+                )
+            batch.execute()
+        
+        attempt += 1
+        if failed and attempt > max_retries:
+            print(f"❌ 再試行上限に達したメッセージ: {len(failed)}件")
+            break
+        pending = failed
+    
+    return fetched
+
+
+def backoff_delay(attempt: int, base_delay: float = BACKOFF_BASE_DELAY, max_delay: float = BACKOFF_MAX_DELAY) -> float:
+    """指数バックオフ＋フルジッターの待機秒数"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_after_seconds(exception: Exception) -> Optional[float]:
+    """Retry-Afterヘッダーの秒数取得（なければNone）"""
+    if not isinstance(exception, HttpError):
+        return None
+    value = exception.resp.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def summarize_latencies(latencies: List[float]) -> Dict:
+    """リクエストレイテンシの集計（ミリ秒）"""
+    if not latencies:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    
+    ordered = sorted(latencies)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 1),
+        'p50_ms': round(statistics.median(ordered) * 1000, 1),
+        'p95_ms': round(ordered[p95_index] * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1)
+    }
+
+
+class QuotaLimiter:
+    """トークンバケットでクォータユニット/秒を超えないよう待機させる"""
+    
+    def __init__(self, units_per_second: float = QUOTA_UNITS_PER_SECOND, clock=time.monotonic, sleep=time.sleep):
+        self.rate = units_per_second
+        self.tokens = float(units_per_second)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+    
+    def acquire(self, units: float) -> None:
+        """unitsユニット分の枠が空くまで待機して消費"""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= units:
+                    self.tokens -= units
+                    return
+                
+                wait = (units - self.tokens) / self.rate
+            
+            self.sleep(wait)
+
+
+class ConcurrentMessageFetcher:
+    """スレッドプールでmessages.getを並列実行（スレッドごとにサービスを保持）"""
+    
+    def __init__(
+        self,
+        service_factory: Callable,
+        max_workers: int = FETCH_MAX_WORKERS,
+        max_retries: int = FETCH_MAX_RETRIES,
+        base_delay: float = BACKOFF_BASE_DELAY,
+        limiter: Optional[QuotaLimiter] = None
+    ):
+        if max_workers < 1:
+            raise ValueError(f"max_workersは1以上で指定してください: {max_workers}")
+        
+        self.service_factory = service_factory
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.limiter = limiter or QuotaLimiter()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gmail-fetch')
+        self.local = threading.local()
+        self.stats_lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.retries = 0
+        self.failures = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def close(self) -> None:
+        """ワーカースレッド停止"""
+        self.executor.shutdown(wait=True)
+    
+    def _service(self):
+        # googleapiclientのhttpはスレッドセーフではないためスレッドごとに生成
+        if not hasattr(self.local, 'service'):
+            self.local.service = self.service_factory()
+        return self.local.service
+    
+    def _record(self, latency: float, retried: bool = False, failed: bool = False) -> None:
+        with self.stats_lock:
+            self.latencies.append(latency)
+            if retried:
+                self.retries += 1
+            if failed:
+                self.failures += 1
+    
+    def _fetch_one(self, message_id: str, get_kwargs: Dict) -> Tuple[str, Optional[Dict]]:
+        attempt = 0
+        
+        while True:
+            self.limiter.acquire(MESSAGE_GET_QUOTA_UNITS)
+            started = time.perf_counter()
+            
+            try:
+                msg = self._service().users().messages().get(
+                    userId='me', id=message_id, **get_kwargs
+                ).execute()
+                self._record(time.perf_counter() - started)
+                return message_id, msg
+            
+            except Exception as e:
+                latency = time.perf_counter() - started
+                
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    self._record(latency, failed=True)
+                    print(f"⚠️ メッセージ取得失敗 {message_id}: {e}")
+                    return message_id, None
+                
+                self._record(latency, retried=True)
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = backoff_delay(attempt, self.base_delay)
+                time.sleep(delay)
+                attempt += 1
+    
+    def fetch(self, message_ids: List[str], **get_kwargs) -> Dict[str, Dict]:
+        """メッセージ並列取得（取得できたものだけを入力順で返す）"""
+        fetched: Dict[str, Dict] = {}
+        unique_ids = list(dict.fromkeys(message_ids))
+        
+        for message_id, msg in self.executor.map(lambda mid: self._fetch_one(mid, get_kwargs), unique_ids):
+            if msg is not None:
+                fetched[message_id] = msg
+        
+        return fetched
+    
+    def stats(self) -> Dict:
+        """レイテンシ・再試行・失敗件数の集計"""
+        with self.stats_lock:
+            summary = summarize_latencies(self.latencies)
+            summary.update({
+                'workers': self.max_workers,
+                'retries': self.retries,
+                'failures': self.failures
+            })
+        return summary
+
+
+def iter_message_id_pages(service, query: str, page_size: int = LIST_PAGE_SIZE) -> Iterator[List[str]]:
+    """検索クエリに一致するメッセージIDをページ単位で取得（nextPageTokenを辿る）"""
+    page_token = None
+    
+    while True:
+        results = service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=page_size,
+            pageToken=page_token
+        ).execute()
+        
+        message_ids = [message['id'] for message in results.get('messages', [])]
+        if message_ids:
+            yield message_ids
+        
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+
+
+def get_current_history_id(service) -> str:
+    """メールボックスの現在のhistoryId取得"""
+    profile = service.users().getProfile(userId='me').execute()
+    return str(profile['historyId'])
+
+
+def list_history_message_ids(service, start_history_id: str) -> Optional[Tuple[List[str], str]]:
+    """start_history_id以降に追加されたメッセージID取得（カーソル失効時はNone）"""
+    message_ids: List[str] = []
+    history_id = str(start_history_id)
+    page_token = None
+    
+    while True:
+        try:
+            results = service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                pageToken=page_token
+            ).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return None
+            raise
+        
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message_ids.append(added['message']['id'])
+        
+        history_id = str(results.get('historyId', history_id))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    
+    return list(dict.fromkeys(message_ids)), history_id
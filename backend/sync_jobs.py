@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Gmail同期のバックグラウンドジョブ実行（重複要求の合流・進捗の公開）
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+PROGRESS_KEYS = ('listed', 'fetched', 'parsed', 'inserted', 'errors')
+
+# 状態照会用に保持する終了済みジョブ数
+JOB_HISTORY_SIZE = 20
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+
+class SyncProgress:
+    """同期の進捗カウンタ（一覧・取得・解析・保存・エラー件数）"""
+    
+    def __init__(self):
+        self.counts = dict.fromkeys(PROGRESS_KEYS, 0)
+        self.lock = threading.Lock()
+    
+    def add(self, **counts: int) -> None:
+        """件数を加算"""
+        with self.lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+    
+    def snapshot(self) -> Dict[str, int]:
+        """現在の件数の写し"""
+        with self.lock:
+            return dict(self.counts)
+
+
+class SyncJob:
+    """1回分の同期ジョブの状態"""
+    
+    def __init__(self, params: Dict):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = JOB_QUEUED
+        self.progress = SyncProgress()
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+    
+    @property
+    def active(self) -> bool:
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+    
+    def to_dict(self) -> Dict:
+        """API応答用の辞書"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'params': self.params,
+            'progress': self.progress.snapshot(),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class SyncJobRunner:
+    """同期ジョブをワーカースレッドで実行（同じキー・同じ引数の実行中・待機中の要求は同じジョブに合流し、
+    同じキーで引数が異なる要求は実行中のジョブの終了後に順に実行）"""
+    
+    def __init__(self, target: Callable, max_workers: int = 1, history_size: int = JOB_HISTORY_SIZE):
+        # targetはtarget(progress=SyncProgress, **params)の形で呼ばれ、結果を返す
+        self.target = target
+        self.history_size = history_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gmail-sync')
+        self.jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self.current: Dict[Hashable, SyncJob] = {}
+        self.queued: Dict[Hashable, List[SyncJob]] = {}
+        self.lock = threading.Lock()
+    
+    def submit(self, key: Hashable = None, **params) -> Tuple[SyncJob, bool]:
+        """ジョブを投入（同じキー・同じ引数のジョブが実行中・待機中ならそれを返す）し、新規作成したかを返す"""
+        with self.lock:
+            current = self.current.get(key)
+            queued = self.queued.setdefault(key, [])
+            pending = queued + [current] if current is not None and current.active else queued
+            for job in pending:
+                if job.params == params:
+                    return job, False
+            
+            job = SyncJob(params)
+            self.jobs[job.id] = job
+            self._trim_history()
+            
+            # 同じキーのジョブは同時に実行しない（引数の異なる要求は終了後に実行）
+            if pending:
+                queued.append(job)
+                return job, True
+            self.current[key] = job
+        
+        self.executor.submit(self._run, key, job)
+        return job, True
+    
+    def _trim_history(self) -> None:
+        # 実行中・待機中のジョブは状態照会できるよう残し、終了済みのものを古い順に追い出す（lock保持中に呼ぶ）
+        excess = len(self.jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if not job.active][:excess]:
+            del self.jobs[job_id]
+    
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        """ジョブ取得（不明・履歴から消えた場合はNone）"""
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """全キーの実行中・待機中のジョブの終了を待機（すべて終了済みならTrue）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        while True:
+            with self.lock:
+                jobs = list(self.current.values())
+                for queued in self.queued.values():
+                    jobs.extend(queued)
+            
+            if all(job.done.is_set() for job in jobs):
+                return True
+            
+            for job in jobs:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if not job.done.wait(remaining):
+                    return False
+    
+    def _run(self, key: Hashable, job: SyncJob) -> None:
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        print(f"🔄 同期ジョブ開始: {job.id}")
+        
+        try:
+            job.result = self.target(progress=job.progress, **job.params)
+            job.status = JOB_SUCCEEDED
+            print(f"✅ 同期ジョブ完了: {job.id}")
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+            print(f"❌ 同期ジョブ失敗 {job.id}: {e}")
+        finally:
+            job.finished_at = time.time()
+            
+            with self.lock:
+                queued = self.queued.get(key)
+                next_job = queued.pop(0) if queued else None
+                if next_job is not None:
+                    self.current[key] = next_job
+                self._trim_history()
+            
+            job.done.set()
+            if next_job is not None:
+                self.executor.submit(self._run, key, next_job)
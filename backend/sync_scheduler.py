@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Gmail定期同期のスケジューラ（ウィークリーメールの到着時刻に合わせ、アカウントごとにジッターで分散）
+"""
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Duolingoのウィークリーレポートは週末〜月曜のUTC早朝に届くため、その後に同期する（月曜=0）
+DEFAULT_WEEKDAYS = (5, 6, 0)
+DEFAULT_HOUR_UTC = 6
+
+# 同じ時刻に全アカウントが同期しないよう各アカウントの実行時刻をずらす最大秒数
+DEFAULT_JITTER_SECONDS = 30 * 60
+
+# アカウントの追加・削除を反映するための最大待機秒数
+ACCOUNT_POLL_SECONDS = 60.0
+
+
+def parse_weekdays(value: str) -> Tuple[int, ...]:
+    """カンマ区切りの曜日番号（月曜=0〜日曜=6）を解析"""
+    try:
+        weekdays = tuple(sorted({int(part) for part in value.split(',') if part.strip()}))
+    except ValueError:
+        raise ValueError(f"曜日は0〜6のカンマ区切りで指定してください: {value}")
+    
+    if not weekdays or not all(0 <= weekday <= 6 for weekday in weekdays):
+        raise ValueError(f"曜日は0〜6のカンマ区切りで指定してください: {value}")
+    return weekdays
+
+
+def next_slot(now: float, weekdays: Sequence[int], hour: int) -> float:
+    """nowより後で最初に来る、指定曜日のhour時（UTC）のUNIX秒"""
+    day = datetime.fromtimestamp(now, tz=timezone.utc).replace(hour=hour, minute=0, second=0, microsecond=0)
+    
+    for offset in range(8):
+        candidate = day + timedelta(days=offset)
+        if candidate.weekday() in weekdays and candidate.timestamp() > now:
+            return candidate.timestamp()
+    
+    raise ValueError(f"曜日が指定されていません: {weekdays}")
+
+
+class SyncScheduler:
+    """アカウントごとの次回同期時刻を管理し、時刻が来たら同期ジョブを投入"""
+    
+    def __init__(
+        self,
+        submit: Callable[[str], object],
+        accounts: Callable[[], Iterable[str]],
+        weekdays: Sequence[int] = DEFAULT_WEEKDAYS,
+        hour: int = DEFAULT_HOUR_UTC,
+        jitter: float = DEFAULT_JITTER_SECONDS,
+        clock: Callable[[], float] = time.time,
+        rng: Optional[random.Random] = None
+    ):
+        # 同時実行数の上限はsubmit先（SyncJobRunnerのワーカー数）で制御する
+        self.submit = submit
+        self.accounts = accounts
+        self.weekdays = tuple(weekdays)
+        self.hour = hour
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.due: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def _schedule(self, account_id: str, now: float) -> None:
+        self.due[account_id] = next_slot(now, self.weekdays, self.hour) + self.rng.uniform(0, self.jitter)
+    
+    def run_pending(self, now: Optional[float] = None) -> List[str]:
+        """実行時刻を過ぎたアカウントの同期を投入し、投入したアカウントIDを返す"""
+        now = self.clock() if now is None else now
+        accounts = set(self.accounts())
+        submitted: List[str] = []
+        
+        with self.lock:
+            for account_id in set(self.due) - accounts:
+                del self.due[account_id]
+            
+            for account_id in sorted(accounts):
+                due = self.due.get(account_id)
+                if due is None:
+                    self._schedule(account_id, now)
+                    continue
+                if due > now:
+                    continue
+                
+                try:
+                    self.submit(account_id)
+                    submitted.append(account_id)
+                except Exception as e:
+                    print(f"❌ 定期同期の投入失敗 {account_id}: {e}")
+                self._schedule(account_id, now)
+        
+        return submitted
+    
+    def next_runs(self) -> Dict[str, float]:
+        """アカウントごとの次回同期時刻（UNIX秒）"""
+        with self.lock:
+            return dict(self.due)
+    
+    def _wait_seconds(self) -> float:
+        with self.lock:
+            nearest = min(self.due.values(), default=None)
+        if nearest is None:
+            return ACCOUNT_POLL_SECONDS
+        return min(ACCOUNT_POLL_SECONDS, max(0.0, nearest - self.clock()))
+    
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"❌ 定期同期スケジューラエラー: {e}")
+            
+            if self.stop_event.wait(self._wait_seconds()):
+                break
+    
+    def start(self) -> None:
+        """スケジューラスレッド起動（起動済みなら何もしない）"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='sync-scheduler', daemon=True)
+        self.thread.start()
+        print(f"⏰ 定期同期スケジューラ起動: 曜日{list(self.weekdays)} {self.hour}時(UTC) ジッター最大{self.jitter:.0f}秒")
+    
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """スケジューラスレッド停止"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
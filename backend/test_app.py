@@ -3,9 +3,52 @@
 app.pyのAPI統合テスト
 """
 import os
+import base64
+import gzip
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
 import pytest
-from app import app
-from database import init_database, insert_reports_bulk, DB_PATH
+from unittest.mock import MagicMock, patch
+from concurrent.futures.process import BrokenProcessPool
+from google.auth.exceptions import RefreshError, TransportError
+from app import (
+    app,
+    list_report_message_id_pages,
+    run_sync_pipeline,
+    sync_gmail_reports,
+    parse_weekly_reports,
+    create_parse_pool,
+    shared_parse_pool,
+    credentials_expiring,
+    get_gmail_service,
+    get_gmail_credentials,
+    GmailAuthRequiredError,
+    reset_gmail_service_cache,
+    response_cache,
+    REPORT_FIELDS,
+    EXPORT_FIELDS,
+    scheduled_accounts,
+    run_auth_command,
+    account_token_path,
+    import_ndjson_reports,
+    reparse_raw_messages,
+    ResponseCache,
+    sync_runner
+)
+from sync_jobs import SyncProgress
+from database import (
+    init_database,
+    insert_reports_bulk,
+    count_reports,
+    get_all_reports,
+    close_all_connections,
+    get_sync_cursor,
+    save_sync_cursor,
+    list_accounts,
+    DB_PATH
+)
 
 
 @pytest.fixture
@@ -13,6 +56,8 @@ def client():
     """Flaskテストクライアント準備"""
     app.config['TESTING'] = True
     
+    response_cache.clear()
+    close_all_connections()
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
     
@@ -21,6 +66,8 @@ def client():
     with app.test_client() as client:
         yield client
     
+    sync_runner.wait(5)
+    close_all_connections()
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
 
@@ -51,8 +98,10 @@ def sample_reports():
 
 
 def test_get_reports_empty_db(client):
-    """正常系: DB空の場合"""
-    response = client.get('/api/duolingo/reports')
+    """正常系: DB空の場合（初回同期ジョブはGmailにアクセスしないものに差し替え）"""
+    with patch.object(sync_runner, 'target', lambda progress, full, account_id: 0):
+        response = client.get('/api/duolingo/reports')
+        sync_runner.wait(5)
     
     assert response.status_code == 200
     data = response.get_json()
@@ -87,3 +136,949 @@ def test_get_reports_order_by_date_desc(client, sample_reports):
     
     assert data['data'][0]['subject'] == 'ウィークリーレポート2'
     assert data['data'][1]['subject'] == 'ウィークリーレポート1'
+
+
+def test_get_reports_paginates_with_cursor(client, sample_reports):
+    """正常系: limitとnext_cursorでページング"""
+    insert_reports_bulk(sample_reports)
+    
+    first = client.get('/api/duolingo/reports?limit=1').get_json()
+    second = client.get(f"/api/duolingo/reports?limit=1&before={first['next_cursor']}").get_json()
+    
+    assert [r['subject'] for r in first['data']] == ['ウィークリーレポート2']
+    assert first['has_more'] is True
+    assert [r['subject'] for r in second['data']] == ['ウィークリーレポート1']
+    assert second['has_more'] is False
+
+
+def test_get_reports_date_range(client, sample_reports):
+    """正常系: since/untilで日付範囲を絞り込む（untilは当日を含む）"""
+    insert_reports_bulk(sample_reports)
+    
+    response = client.get('/api/duolingo/reports?since=2025-08-30&until=2025-08-30')
+    data = response.get_json()
+    
+    assert [r['subject'] for r in data['data']] == ['ウィークリーレポート1']
+
+
+@pytest.mark.parametrize('query', [
+    'limit=0', 'limit=abc', 'before=x:y', 'since=2025/08/30',
+    'before=99999999999999999999999:1', 'after=1:-99999999999999999999999', 'before=9223372036854775808'
+])
+def test_get_reports_invalid_params(client, query):
+    """異常系: 不正なページングパラメータは400"""
+    response = client.get(f'/api/duolingo/reports?{query}')
+    
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_get_summary(client, sample_reports):
+    """正常系: 合計・平均・先週比をSQL集計から返す"""
+    insert_reports_bulk(sample_reports)
+    
+    data = client.get('/api/duolingo/summary').get_json()
+    
+    assert data['success'] is True
+    assert data['summary']['count'] == 2
+    assert data['summary']['total_xp'] == 300
+    assert data['summary']['total_minutes'] == 110
+    assert data['summary']['avg_lessons_per_week'] == 12.5
+    assert data['summary']['current_streak'] == 6
+    assert data['summary']['max_streak'] == 6
+    assert data['week_over_week']['delta'] == {'xp': 100, 'minutes': 10, 'lessons': 5, 'streak': 1}
+    assert 'groups' not in data
+
+
+def test_get_summary_empty_db(client):
+    """境界値: DB空の場合は0と先週比なし"""
+    data = client.get('/api/duolingo/summary').get_json()
+    
+    assert data['summary']['count'] == 0
+    assert data['summary']['avg_xp_per_week'] == 0
+    assert data['week_over_week'] is None
+
+
+def test_get_summary_group_by_month(client, sample_reports):
+    """正常系: 月別集計"""
+    insert_reports_bulk(sample_reports + [dict(sample_reports[0], message_id='msg003', date='Sun, 07 Sep 2025 05:00:37 +0000')])
+    
+    data = client.get('/api/duolingo/summary?group_by=month').get_json()
+    
+    assert [(g['period'], g['count'], g['total_xp']) for g in data['groups']] == [('2025-08', 2, 300), ('2025-09', 1, 100)]
+
+
+def test_get_summary_invalid_group_by(client):
+    """異常系: 未対応のgroup_byは400"""
+    response = client.get('/api/duolingo/summary?group_by=day')
+    
+    assert response.status_code == 400
+
+
+def test_get_reports_not_modified(client, sample_reports):
+    """正常系: If-None-Matchが現在の版と一致すれば304"""
+    insert_reports_bulk(sample_reports)
+    first = client.get('/api/duolingo/reports')
+    etag = first.headers['ETag']
+    
+    response = client.get('/api/duolingo/reports', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_get_reports_etag_changes_on_upsert(client, sample_reports):
+    """正常系: 件数が変わらない指標更新でもETagが変わる"""
+    insert_reports_bulk(sample_reports)
+    etag = client.get('/api/duolingo/reports').headers['ETag']
+    
+    insert_reports_bulk([dict(sample_reports[0], xp=999)], upsert=True)
+    response = client.get('/api/duolingo/reports', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_get_reports_if_modified_since(client, sample_reports):
+    """正常系: If-None-MatchがなければIf-Modified-Sinceで判定"""
+    insert_reports_bulk(sample_reports)
+    last_modified = client.get('/api/duolingo/reports').headers['Last-Modified']
+    
+    response = client.get('/api/duolingo/reports', headers={'If-Modified-Since': last_modified})
+    
+    assert response.status_code == 304
+
+
+def test_get_summary_not_modified(client, sample_reports):
+    """正常系: サマリも同じ版数で304"""
+    insert_reports_bulk(sample_reports)
+    etag = client.get('/api/duolingo/summary?group_by=month').headers['ETag']
+    
+    response = client.get('/api/duolingo/summary?group_by=month', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 304
+
+
+def test_get_reports_served_from_cache(client, sample_reports):
+    """正常系: 同じクエリの2回目はDBを読まずキャッシュから返す"""
+    insert_reports_bulk(sample_reports)
+    first = client.get('/api/duolingo/reports?limit=1')
+    
+    with patch('app.get_reports_page') as mock_page, patch('app.get_reports_version') as mock_version:
+        second = client.get('/api/duolingo/reports?limit=1')
+        not_modified = client.get('/api/duolingo/reports?limit=1', headers={'If-None-Match': first.headers['ETag']})
+    
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert not_modified.status_code == 304
+    mock_page.assert_not_called()
+    mock_version.assert_not_called()
+
+
+def test_response_cache_invalidated_on_insert(client, sample_reports):
+    """正常系: 行が追加されたらキャッシュを破棄し、変化なしなら保持"""
+    insert_reports_bulk(sample_reports[:1])
+    client.get('/api/duolingo/summary')
+    
+    insert_reports_bulk(sample_reports[:1])
+    assert len(response_cache.entries) == 1
+    
+    insert_reports_bulk(sample_reports[1:])
+    data = client.get('/api/duolingo/summary').get_json()
+    
+    assert data['summary']['count'] == 2
+
+
+def test_response_cache_evicts_least_recently_used():
+    """正常系: 上限を超えたら最も古く使われた本文を追い出す"""
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', b'1', {}, cache.generation)
+    cache.put('b', b'2', {}, cache.generation)
+    cache.get('a')
+    cache.put('c', b'3', {}, cache.generation)
+    
+    assert list(cache.entries) == ['a', 'c']
+
+
+def test_response_cache_skips_stale_put():
+    """異常系: 読み取り中に破棄された場合は古い本文を格納しない"""
+    cache = ResponseCache()
+    generation = cache.generation
+    cache.clear()
+    
+    cache.put('a', b'stale', {}, generation)
+    
+    assert cache.get('a') is None
+
+
+def test_get_reports_empty_db_starts_sync_job(client):
+    """正常系: DB空なら同期を待たずにジョブを開始して空の一覧を返す"""
+    started = threading.Event()
+    release = threading.Event()
+    
+    def fake_sync(progress, full, account_id):
+        started.set()
+        release.wait(5)
+        return 0
+    
+    with patch.object(sync_runner, 'target', fake_sync):
+        data = client.get('/api/duolingo/reports').get_json()
+        started.wait(5)
+        second = client.get('/api/duolingo/reports').get_json()
+        release.set()
+        sync_runner.wait(5)
+    
+    assert data['data'] == []
+    assert data['sync_job'] is not None
+    assert second['syncing'] is True
+    assert second['sync_job']['id'] == data['sync_job']['id']
+
+
+def test_sync_returns_accepted_job(client):
+    """正常系: 同期は202とジョブIDを返し、状態を照会できる"""
+    def fake_sync(progress, full, account_id):
+        progress.add(listed=3, inserted=1)
+        return 1
+    
+    with patch.object(sync_runner, 'target', fake_sync):
+        response = client.post('/api/duolingo/sync?full=1')
+        job_id = response.get_json()['job']['id']
+        sync_runner.wait(5)
+    
+    status = client.get(f'/api/duolingo/sync/{job_id}').get_json()
+    
+    assert response.status_code == 202
+    assert response.headers['Location'].endswith(f'/api/duolingo/sync/{job_id}')
+    assert status['job']['status'] == 'succeeded'
+    assert status['job']['params'] == {'account_id': 'default', 'full': True}
+    assert status['job']['result'] == 1
+    assert status['job']['progress']['listed'] == 3
+
+
+def test_full_sync_not_merged_into_incremental(client):
+    """正常系: 差分同期の実行中に来たフル同期は合流せず、終了後に実行"""
+    release = threading.Event()
+    calls = []
+    
+    def fake_sync(progress, full, account_id):
+        calls.append(full)
+        release.wait(5)
+        return 0
+    
+    with patch.object(sync_runner, 'target', fake_sync):
+        client.post('/api/duolingo/sync')
+        response = client.post('/api/duolingo/sync?full=1')
+        release.set()
+        sync_runner.wait(5)
+    
+    assert response.status_code == 202
+    assert response.get_json()['deduplicated'] is False
+    assert calls == [False, True]
+
+
+def test_sync_job_not_found(client):
+    """異常系: 不明なジョブIDは404"""
+    response = client.get('/api/duolingo/sync/unknown')
+    
+    assert response.status_code == 404
+
+
+@pytest.fixture
+def accounts_dir(tmp_path, monkeypatch):
+    """アカウント別DBの保存先を一時ディレクトリへ"""
+    monkeypatch.setattr('database.ACCOUNTS_DIR', str(tmp_path))
+    yield tmp_path
+    sync_runner.wait(5)
+    close_all_connections()
+
+
+def test_accounts_are_isolated(client, accounts_dir, sample_reports):
+    """正常系: アカウントごとのレポートは互いに見えない"""
+    created = client.post('/api/accounts', json={'account_id': 'alice'})
+    lines = '\n'.join(json.dumps(report) for report in sample_reports)
+    client.post('/api/accounts/alice/duolingo/import', data=lines)
+    
+    alice = client.get('/api/accounts/alice/duolingo/reports').get_json()
+    accounts = client.get('/api/accounts').get_json()['accounts']
+    
+    assert created.status_code == 201
+    assert alice['count'] == 2
+    assert count_reports() == 0
+    assert accounts == ['default', 'alice']
+
+
+def test_account_invalid_or_unknown(client, accounts_dir):
+    """異常系: 不正なアカウントIDは400、未作成のアカウントは404"""
+    invalid = client.post('/api/accounts', json={'account_id': '../x'})
+    unknown = client.get('/api/accounts/bob/duolingo/summary')
+    
+    assert invalid.status_code == 400
+    assert unknown.status_code == 404
+
+
+def test_auth_command_creates_account(accounts_dir):
+    """正常系: 未作成のアカウントを認証するとアカウントを作成してから認証"""
+    with patch('app.ensure_gmail_auth', return_value=MagicMock()) as mock_auth:
+        run_auth_command(['alice'])
+    
+    assert 'alice' in list_accounts()
+    mock_auth.assert_called_once_with(account_token_path('alice'))
+
+
+def test_auth_command_invalid_account(accounts_dir):
+    """異常系: 不正なアカウントIDは認証せず使い方を表示して終了"""
+    with patch('app.ensure_gmail_auth') as mock_auth:
+        with pytest.raises(SystemExit) as exit_info:
+            run_auth_command(['../x'])
+    
+    assert exit_info.value.code == 2
+    mock_auth.assert_not_called()
+
+
+def test_sync_jobs_run_per_account(client, accounts_dir):
+    """正常系: 同期ジョブはアカウントごとに投入され、別アカウントのジョブIDは照会できない"""
+    client.post('/api/accounts', json={'account_id': 'alice'})
+    
+    def fake_sync(progress, full, account_id):
+        return account_id
+    
+    with patch.object(sync_runner, 'target', fake_sync):
+        job_id = client.post('/api/accounts/alice/duolingo/sync').get_json()['job']['id']
+        sync_runner.wait(5)
+    
+    status = client.get(f'/api/accounts/alice/duolingo/sync/{job_id}').get_json()
+    
+    assert status['job']['result'] == 'alice'
+    assert client.get(f'/api/duolingo/sync/{job_id}').status_code == 404
+
+
+@pytest.fixture
+def many_reports(sample_reports):
+    """圧縮閾値を超える件数のレポート"""
+    return [
+        dict(sample_reports[0], message_id=f'msg{i:03d}', date=f'Sat, {1 + i % 28:02d} Aug 2025 05:00:37 +0000')
+        for i in range(50)
+    ]
+
+
+def test_get_reports_gzip_compressed(client, many_reports):
+    """正常系: Accept-Encoding: gzipなら閾値以上の応答を圧縮"""
+    insert_reports_bulk(many_reports)
+    
+    plain = client.get('/api/duolingo/reports')
+    compressed = client.get('/api/duolingo/reports', headers={'Accept-Encoding': 'gzip'})
+    
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+    assert len(compressed.data) < len(plain.data)
+
+
+def test_cached_response_reuses_compressed_body(client, many_reports):
+    """正常系: キャッシュ済み応答は圧縮結果も使い回し、圧縮後もETagで304"""
+    insert_reports_bulk(many_reports)
+    first = client.get('/api/duolingo/reports', headers={'Accept-Encoding': 'gzip'})
+    
+    with patch('app.gzip.compress') as mock_compress:
+        second = client.get('/api/duolingo/reports', headers={'Accept-Encoding': 'gzip'})
+    not_modified = client.get(
+        '/api/duolingo/reports',
+        headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']}
+    )
+    
+    assert second.data == first.data
+    mock_compress.assert_not_called()
+    assert not_modified.status_code == 304
+
+
+def test_small_response_not_compressed(client):
+    """境界値: 閾値未満の応答は圧縮しない"""
+    response = client.get('/api/duolingo/summary', headers={'Accept-Encoding': 'gzip'})
+    
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_reports_serialized_fields(client, sample_reports):
+    """正常系: 一覧はクライアントが使う列だけを返し、標準jsonでも同じ内容"""
+    insert_reports_bulk(sample_reports)
+    
+    fast = client.get('/api/duolingo/reports?limit=1').get_json()
+    response_cache.clear()
+    with patch('app.orjson', None):
+        fallback = client.get('/api/duolingo/reports?limit=1').get_json()
+    
+    assert fast == fallback
+    assert tuple(fast['data'][0]) == REPORT_FIELDS
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_json_provider_falls_back_to_flask_default(use_orjson, monkeypatch):
+    """正常系: JSON標準外の型はorjsonの有無によらずFlask既定と同じ形式で変換し、引数指定は標準のjsonに渡す"""
+    if not use_orjson:
+        monkeypatch.setattr('app.orjson', None)
+    value = {'b': date(2025, 1, 2), 'a': Decimal('1.5')}
+    
+    assert json.loads(app.json.dumps(value)) == {'b': 'Thu, 02 Jan 2025 00:00:00 GMT', 'a': '1.5'}
+    assert app.json.dumps(value, sort_keys=True, indent=2) == json.dumps(
+        {'a': '1.5', 'b': 'Thu, 02 Jan 2025 00:00:00 GMT'}, sort_keys=True, indent=2, separators=(',', ':')
+    )
+
+
+def test_json_provider_rejects_unknown_type():
+    """異常系: 変換できない型はTypeError"""
+    with pytest.raises(TypeError):
+        app.json.dumps({'v': object()})
+
+
+def test_export_ndjson_round_trip(client, many_reports):
+    """正常系: NDJSONエクスポートを空のDBへインポートすると同じ内容に戻る"""
+    insert_reports_bulk(many_reports)
+    exported = client.get('/api/duolingo/export')
+    lines = exported.data.decode('utf-8').splitlines()
+    
+    close_all_connections()
+    os.remove(DB_PATH)
+    init_database()
+    response = client.post('/api/duolingo/import', data=exported.data)
+    
+    assert exported.mimetype == 'application/x-ndjson'
+    assert len(lines) == 50
+    assert json.loads(lines[0])['message_id'] == 'msg000'
+    assert tuple(json.loads(lines[0])) == EXPORT_FIELDS
+    assert response.get_json()['import_info'] == {'received': 50, 'inserted': 50}
+    assert client.get('/api/duolingo/export').data == exported.data
+
+
+def test_export_csv(client, sample_reports):
+    """正常系: CSVはヘッダー行と日付昇順の行"""
+    insert_reports_bulk(sample_reports)
+    
+    response = client.get('/api/duolingo/export?format=csv')
+    lines = response.data.decode('utf-8').splitlines()
+    
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert lines[0] == 'message_id,subject,date,xp,minutes,lessons,streak'
+    assert lines[1].startswith('msg001,ウィークリーレポート1,')
+    assert len(lines) == 3
+
+
+def test_export_invalid_format(client):
+    """異常系: 未対応のformatは400"""
+    assert client.get('/api/duolingo/export?format=xml').status_code == 400
+
+
+def test_import_ndjson_reports_in_chunks(client, sample_reports):
+    """正常系: chunk_size件ずつinsert_reports_bulkへ渡し、空行は無視"""
+    lines = [json.dumps(report) + '\n' for report in sample_reports * 2] + ['\n']
+    
+    with patch('app.insert_reports_bulk', wraps=insert_reports_bulk) as mock_insert:
+        counts = import_ndjson_reports(lines, chunk_size=3)
+    
+    assert counts == {'received': 4, 'inserted': 2}
+    assert [len(c[0][0]) for c in mock_insert.call_args_list] == [3, 1]
+
+
+def test_import_invalid_line(client, sample_reports):
+    """異常系: 不正な行は行番号付きで400、それ以前のチャンクは保存済み"""
+    body = json.dumps(sample_reports[0]) + '\n' + '{"message_id": "broken"}\n'
+    
+    response = client.post('/api/duolingo/import', data=body)
+    
+    assert response.status_code == 400
+    assert '2行目' in response.get_json()['error']
+
+
+def test_import_rejects_wrong_types(client, sample_reports):
+    """異常系: 文字列でない日付・整数でない指標・nullは行番号付きで400、何も保存しない"""
+    for field, value in (('date', 123), ('xp', 'abc'), ('minutes', None), ('lessons', 1.5), ('streak', True)):
+        body = json.dumps(dict(sample_reports[0], **{field: value})) + '\n'
+        
+        response = client.post('/api/duolingo/import', data=body)
+        
+        assert response.status_code == 400
+        assert '1行目' in response.get_json()['error']
+        assert field in response.get_json()['error']
+    
+    assert count_reports() == 0
+
+
+def make_gmail_message(message_id, subject, body_text):
+    """テスト用Gmailメッセージ生成"""
+    return {
+        'id': message_id,
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'Date', 'value': 'Sun, 31 Aug 2025 05:00:37 +0000'}
+            ],
+            'body': {'data': base64.urlsafe_b64encode(body_text.encode('utf-8')).decode('ascii')}
+        }
+    }
+
+
+def fake_fetch(service, message_ids, **kwargs):
+    """fetch_messages_batchの代替（format=metadataならヘッダーとスニペットのみ）"""
+    fetched = {}
+    for mid in message_ids:
+        subject = 'お知らせ' if mid.startswith('ad') else 'ウィークリーレポート'
+        msg = make_gmail_message(mid, subject, '100XP 50分 レッスン 10回 5日連続')
+        if kwargs.get('format') == 'metadata':
+            msg = {'id': mid, 'snippet': 'セール開催中', 'payload': {'headers': msg['payload']['headers']}}
+        else:
+            del msg['payload']['headers']
+        fetched[mid] = msg
+    return fetched
+
+
+def test_list_report_message_id_pages_full_sync():
+    """正常系: カーソルなしの場合はクエリ全件を取得"""
+    service = MagicMock()
+    
+    with patch('app.get_current_history_id', return_value='500'), \
+            patch('app.iter_message_id_pages', return_value=iter([['msg1', 'msg2']])):
+        pages, next_cursor = list_report_message_id_pages(service)
+        
+        assert list(pages) == [['msg1', 'msg2']]
+    
+    assert next_cursor['history_id'] == '500'
+
+
+def test_list_report_message_id_pages_incremental_no_changes():
+    """正常系: 差分なしの場合はメッセージ一覧を取得しない"""
+    service = MagicMock()
+    cursor = {'history_id': '500', 'watermark': 1756530037}
+    
+    with patch('app.list_history_message_ids', return_value=([], '510')), \
+            patch('app.iter_message_id_pages') as iter_pages:
+        pages, next_cursor = list_report_message_id_pages(service, cursor)
+    
+    assert list(pages) == []
+    assert next_cursor['history_id'] == '510'
+    iter_pages.assert_not_called()
+
+
+def test_list_report_message_id_pages_incremental_filters_added():
+    """正常系: 差分同期は追加されたメッセージのみ対象、全件見つかれば打ち切り"""
+    service = MagicMock()
+    cursor = {'history_id': '500', 'watermark': 1756530037}
+    consumed = []
+    
+    def iter_pages(service, query):
+        for page in (['msg3', 'msg1'], ['msg4']):
+            consumed.append(page)
+            yield page
+    
+    with patch('app.list_history_message_ids', return_value=(['msg3'], '510')), \
+            patch('app.iter_message_id_pages', side_effect=iter_pages) as iter_mock:
+        pages, _ = list_report_message_id_pages(service, cursor)
+        
+        assert list(pages) == [['msg3']]
+    
+    assert consumed == [['msg3', 'msg1']]
+    assert 'after:' in iter_mock.call_args[0][1]
+
+
+def test_list_report_message_id_pages_expired_cursor_falls_back():
+    """異常系: カーソル失効時はフル同期にフォールバック"""
+    service = MagicMock()
+    cursor = {'history_id': '1', 'watermark': 1756530037}
+    
+    with patch('app.list_history_message_ids', return_value=None), \
+            patch('app.get_current_history_id', return_value='600'), \
+            patch('app.iter_message_id_pages', return_value=iter([['msg1']])):
+        pages, next_cursor = list_report_message_id_pages(service, cursor)
+        
+        assert list(pages) == [['msg1']]
+    
+    assert next_cursor['history_id'] == '600'
+
+
+def test_run_sync_pipeline_inserts_in_chunks(client):
+    """正常系: チャンク単位で取得・保存し、保存済みIDは取得しない"""
+    insert_reports_bulk([{
+        'message_id': 'msg0',
+        'subject': 'ウィークリーレポート',
+        'date': 'Sat, 30 Aug 2025 05:00:37 +0000',
+        'xp': 1,
+        'minutes': 1,
+        'lessons': 1,
+        'streak': 1
+    }])
+    pages = iter([['msg0', 'msg1', 'msg2'], ['msg3', 'msg4']])
+    
+    with patch('app.fetch_messages_batch', side_effect=fake_fetch) as fetch:
+        new_count = run_sync_pipeline(MagicMock(), pages, chunk_size=2)
+    
+    assert new_count == 4
+    assert count_reports() == 5
+    metadata_calls = [c[0][1] for c in fetch.call_args_list if c[1]['format'] == 'metadata']
+    assert metadata_calls == [['msg1'], ['msg2', 'msg3'], ['msg4']]
+
+
+def test_run_sync_pipeline_keeps_committed_chunks_on_failure(client):
+    """異常系: 途中で失敗してもコミット済みチャンクは残る"""
+    def failing_pages():
+        yield ['msg1', 'msg2']
+        raise RuntimeError('list failed')
+    
+    with patch('app.fetch_messages_batch', side_effect=fake_fetch):
+        with pytest.raises(RuntimeError):
+            run_sync_pipeline(MagicMock(), failing_pages(), chunk_size=2)
+    
+    assert count_reports() == 2
+
+
+def test_run_sync_pipeline_fetches_body_only_for_candidates(client):
+    """正常系: メタデータで除外されたメッセージは本文を取得しない"""
+    pages = iter([['msg1', 'ad1']])
+    
+    with patch('app.fetch_messages_batch', side_effect=fake_fetch) as fetch:
+        new_count = run_sync_pipeline(MagicMock(), pages)
+    
+    calls = [(c[0][1], c[1].get('format')) for c in fetch.call_args_list]
+    assert calls == [(['msg1', 'ad1'], 'metadata'), (['msg1'], 'full')]
+    assert new_count == 1
+
+
+def test_reparse_raw_messages_without_network(client):
+    """正常系: 同期時に保存した生メッセージを新しい抽出ルールで再解析して指標を更新"""
+    with patch('app.fetch_messages_batch', side_effect=fake_fetch):
+        run_sync_pipeline(MagicMock(), iter([['msg1', 'msg2', 'ad1']]))
+    
+    with patch('app.fetch_messages_batch') as fetch, \
+            patch('app.parse_message', return_value={'xp': 999, 'minutes': 1, 'lessons': 1, 'streak': 1}):
+        counts = reparse_raw_messages()
+    
+    fetch.assert_not_called()
+    assert counts == {'messages': 2, 'parsed': 2, 'inserted': 0, 'errors': 0}
+    assert [report['xp'] for report in get_all_reports()] == [999, 999]
+
+
+def test_run_sync_pipeline_full_backfills_raw_messages(client, sample_reports):
+    """正常系: 生メッセージ未保存のレポートはフル同期時のみ本文を取り直す"""
+    insert_reports_bulk([dict(sample_reports[0], message_id='msg1')])
+    
+    with patch('app.fetch_messages_batch', side_effect=fake_fetch) as fetch:
+        run_sync_pipeline(MagicMock(), iter([['msg1']]))
+        incremental_calls = fetch.call_count
+        run_sync_pipeline(MagicMock(), iter([['msg1']]), require_raw=True)
+        run_sync_pipeline(MagicMock(), iter([['msg1']]), require_raw=True)
+    
+    assert incremental_calls == 0
+    assert fetch.call_count == 2
+    assert count_reports() == 1
+
+
+def test_reparse_endpoint(client):
+    """正常系: 再解析APIは件数を返す"""
+    with patch('app.fetch_messages_batch', side_effect=fake_fetch):
+        run_sync_pipeline(MagicMock(), iter([['msg1']]))
+    
+    response = client.post('/api/duolingo/reparse')
+    data = response.get_json()
+    
+    assert response.status_code == 200
+    assert data['messages'] == 1
+    assert data['parsed'] == 1
+
+
+def test_run_sync_pipeline_reports_progress(client):
+    """正常系: 一覧・取得・解析・保存・エラー件数を進捗に加算"""
+    progress = SyncProgress()
+    pages = iter([['msg1', 'ad1', 'gone1']])
+    
+    def flaky_fetch(service, message_ids, **kwargs):
+        return fake_fetch(service, [mid for mid in message_ids if mid != 'gone1'], **kwargs)
+    
+    with patch('app.fetch_messages_batch', side_effect=flaky_fetch):
+        run_sync_pipeline(MagicMock(), pages, progress=progress)
+    
+    assert progress.snapshot() == {'listed': 3, 'fetched': 2, 'parsed': 1, 'inserted': 1, 'errors': 1}
+    assert get_all_reports()[0]['date'] == 'Sun, 31 Aug 2025 05:00:37 +0000'
+
+
+def run_sync_with_fetch(fetch, full=False):
+    """Gmail一覧を固定し、取得をfetchに差し替えて同期"""
+    pages = iter([['msg1', 'msg2']])
+    next_cursor = {'history_id': '200', 'watermark': 2000}
+    
+    with patch('app.get_gmail_service', return_value=MagicMock()), \
+            patch('app.list_report_message_id_pages', return_value=(pages, next_cursor)), \
+            patch('app.fetch_messages_batch', side_effect=fetch):
+        return sync_gmail_reports(full=full, parse_workers=0)
+
+
+def test_sync_advances_cursor_when_all_fetched(client):
+    """正常系: 全件取得できたら同期カーソルを進める"""
+    save_sync_cursor('100', 1000)
+    
+    run_sync_with_fetch(fake_fetch)
+    
+    assert get_sync_cursor()['history_id'] == '200'
+
+
+def test_sync_keeps_cursor_on_fetch_errors(client):
+    """異常系: 取得に失敗したメッセージがあれば同期カーソルを進めず、次回の差分で再取得"""
+    save_sync_cursor('100', 1000)
+    
+    def failing_body_fetch(service, message_ids, **kwargs):
+        if kwargs.get('format') == 'full':
+            message_ids = [mid for mid in message_ids if mid != 'msg2']
+        return fake_fetch(service, message_ids, **kwargs)
+    
+    new_count = run_sync_with_fetch(failing_body_fetch)
+    cursor = get_sync_cursor()
+    
+    assert new_count == 1
+    assert cursor['history_id'] == '100'
+    assert cursor['watermark'] == 1000
+
+
+def test_full_sync_clears_cursor_on_fetch_errors(client):
+    """異常系: フル同期で取得に失敗したら同期カーソルを消して次回もフル同期"""
+    save_sync_cursor('100', 1000)
+    
+    def failing_metadata_fetch(service, message_ids, **kwargs):
+        return fake_fetch(service, [mid for mid in message_ids if mid != 'msg1'], **kwargs)
+    
+    run_sync_with_fetch(failing_metadata_fetch, full=True)
+    
+    assert get_sync_cursor() is None
+
+
+@pytest.fixture
+def gmail_cache():
+    """Gmailクライアントキャッシュ初期化"""
+    reset_gmail_service_cache()
+    yield
+    reset_gmail_service_cache()
+
+
+def make_credentials(expires_in):
+    """テスト用認証情報"""
+    creds = MagicMock()
+    creds.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + expires_in
+    creds.refresh_token = 'refresh'
+    return creds
+
+
+def test_credentials_expiring():
+    """正常系: 期限5分前を切ったら期限切れ間近"""
+    assert credentials_expiring(make_credentials(timedelta(minutes=1))) is True
+    assert credentials_expiring(make_credentials(timedelta(hours=1))) is False
+
+
+def test_get_gmail_service_cached_per_thread(gmail_cache):
+    """正常系: 認証とサービス構築は1回だけ、別スレッドは認証情報を共有"""
+    creds = make_credentials(timedelta(hours=1))
+    
+    with patch('app.ensure_gmail_auth', return_value=creds) as auth, \
+            patch('app.build_from_document', side_effect=lambda doc, credentials: object()) as build:
+        first = get_gmail_service()
+        second = get_gmail_service()
+        
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_gmail_service()))
+        thread.start()
+        thread.join()
+    
+    assert first is second
+    assert other[0] is not first
+    assert auth.call_count == 1
+    assert build.call_count == 2
+
+
+def test_scheduled_accounts_require_token(client, accounts_dir, tmp_path, monkeypatch):
+    """正常系: 定期同期は認証情報が保存済みのアカウントのみ"""
+    monkeypatch.chdir(tmp_path)
+    client.post('/api/accounts', json={'account_id': 'alice'})
+    client.post('/api/accounts', json={'account_id': 'bob'})
+    (accounts_dir / 'alice' / 'token.json').write_text('{}')
+    
+    assert scheduled_accounts() == ['alice']
+
+
+def test_get_gmail_service_per_account(gmail_cache, accounts_dir):
+    """正常系: アカウントごとに別の認証情報ファイルを使う"""
+    with patch('app.ensure_gmail_auth', side_effect=lambda path, interactive: make_credentials(timedelta(hours=1))) as auth, \
+            patch('app.build_from_document', side_effect=lambda doc, credentials: object()):
+        default = get_gmail_service()
+        alice = get_gmail_service('alice')
+    
+    assert default is not alice
+    assert [call.args[0] for call in auth.call_args_list] == [
+        'token.json', os.path.join(str(accounts_dir), 'alice', 'token.json')
+    ]
+
+
+def test_get_gmail_credentials_never_starts_browser_flow(gmail_cache, tmp_path, monkeypatch):
+    """異常系: 認証情報がなければブラウザ認証せず未認証エラー"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'credentials.json').write_text('{}')
+    
+    with patch('app.InstalledAppFlow') as flow:
+        with pytest.raises(GmailAuthRequiredError):
+            get_gmail_credentials()
+    
+    flow.from_client_secrets_file.assert_not_called()
+
+
+def test_get_gmail_credentials_locks_per_account(gmail_cache, accounts_dir):
+    """正常系: あるアカウントの認証待ちの間も他のアカウントの認証情報を取得できる"""
+    started = threading.Event()
+    release = threading.Event()
+    
+    def auth(path, interactive):
+        if 'alice' in path:
+            started.set()
+            release.wait(5)
+        return make_credentials(timedelta(hours=1))
+    
+    with patch('app.ensure_gmail_auth', side_effect=auth):
+        thread = threading.Thread(target=get_gmail_credentials, args=('alice',))
+        thread.start()
+        started.wait(5)
+        
+        other = []
+        waiter = threading.Thread(target=lambda: other.append(get_gmail_credentials()))
+        waiter.start()
+        waiter.join(2)
+        blocked = waiter.is_alive()
+        
+        release.set()
+        thread.join(5)
+        waiter.join(5)
+    
+    assert blocked is False
+    assert len(other) == 1
+
+
+def test_get_gmail_service_refreshes_before_expiry(gmail_cache, tmp_path, monkeypatch):
+    """正常系: 期限切れ間近なら先行リフレッシュしてtoken.jsonを更新"""
+    monkeypatch.chdir(tmp_path)
+    creds = make_credentials(timedelta(minutes=1))
+    creds.to_json.return_value = '{}'
+    
+    with patch('app.ensure_gmail_auth', return_value=creds), \
+            patch('app.build_from_document', return_value=object()):
+        get_gmail_service()
+        get_gmail_service()
+    
+    creds.refresh.assert_called_once()
+    assert (tmp_path / 'token.json').exists()
+
+
+def test_get_gmail_credentials_reauths_after_refresh_error(gmail_cache, tmp_path, monkeypatch):
+    """異常系: リフレッシュ失敗（失効）時はキャッシュを破棄してtoken.jsonから再認証"""
+    monkeypatch.chdir(tmp_path)
+    revoked = make_credentials(timedelta(minutes=1))
+    revoked.refresh.side_effect = RefreshError('invalid_grant')
+    fresh = make_credentials(timedelta(hours=1))
+    
+    with patch('app.ensure_gmail_auth', side_effect=[revoked, fresh]) as auth:
+        first = get_gmail_credentials()
+        second = get_gmail_credentials()
+        third = get_gmail_credentials()
+    
+    assert first is revoked
+    assert second is fresh
+    assert third is fresh
+    assert auth.call_count == 2
+
+
+def write_expired_token(path):
+    """期限切れのアクセストークンとリフレッシュトークンを持つtoken.json"""
+    path.write_text(json.dumps({
+        'token': 'expired',
+        'refresh_token': 'refresh',
+        'client_id': 'client',
+        'client_secret': 'secret',
+        'expiry': '2020-01-01T00:00:00Z'
+    }))
+
+
+@pytest.mark.parametrize('error', [
+    TransportError('connection reset'),
+    RefreshError('temporarily_unavailable', retryable=True)
+])
+def test_transient_refresh_error_keeps_token(gmail_cache, client, accounts_dir, tmp_path, monkeypatch, error):
+    """異常系: 通信エラーなど一時的なリフレッシュ失敗ではtoken.jsonを消さず、次回の定期同期で再試行できる"""
+    monkeypatch.chdir(tmp_path)
+    write_expired_token(tmp_path / 'token.json')
+    
+    with patch('google.oauth2.credentials.Credentials.refresh', side_effect=error):
+        with pytest.raises(type(error)):
+            get_gmail_credentials()
+    
+    assert (tmp_path / 'token.json').exists()
+    assert scheduled_accounts() == ['default']
+
+
+def test_revoked_refresh_token_deletes_token(gmail_cache, tmp_path, monkeypatch):
+    """異常系: リフレッシュトークンが失効していればtoken.jsonを削除して未認証エラー"""
+    monkeypatch.chdir(tmp_path)
+    write_expired_token(tmp_path / 'token.json')
+    revoked = RefreshError('invalid_grant: Token has been expired or revoked.', {'error': 'invalid_grant'})
+    
+    with patch('google.oauth2.credentials.Credentials.refresh', side_effect=revoked):
+        with pytest.raises(GmailAuthRequiredError):
+            get_gmail_credentials()
+    
+    assert not (tmp_path / 'token.json').exists()
+
+
+def test_get_gmail_credentials_drops_expired_without_refresh_token(gmail_cache):
+    """異常系: リフレッシュトークンのない期限切れ認証情報は返さない"""
+    expired = make_credentials(timedelta(minutes=-1))
+    expired.refresh_token = None
+    expired.expired = True
+    
+    with patch('app.ensure_gmail_auth', side_effect=[expired, None]):
+        get_gmail_credentials()
+        with pytest.raises(GmailAuthRequiredError):
+            get_gmail_credentials()
+    
+    expired.refresh.assert_not_called()
+
+
+def test_parse_weekly_reports_with_process_pool():
+    """正常系: プロセスプールで解析しても入力順・結果は同じ"""
+    message_ids = [f'msg{i}' for i in range(20)]
+    metadata = {}
+    bodies = {}
+    for i, mid in enumerate(message_ids):
+        msg = make_gmail_message(mid, 'ウィークリーレポート', f'{i}XP {i}分 レッスン {i}回 {i}日連続')
+        metadata[mid] = msg
+        bodies[mid] = msg
+    
+    with create_parse_pool(2) as pool:
+        parallel = parse_weekly_reports(message_ids, metadata, bodies, pool)
+    serial = parse_weekly_reports(message_ids, metadata, bodies)
+    
+    assert parallel == serial
+    assert [r['message_id'] for r in parallel] == message_ids
+    assert parallel[7]['data'] == {'xp': 7, 'minutes': 7, 'lessons': 7, 'streak': 7}
+
+
+def test_shared_parse_pool_reused_and_replaced_when_broken(monkeypatch):
+    """正常系: 解析用プールは同期をまたいで使い回し、ワーカーが落ちて壊れたら次回作り直す"""
+    monkeypatch.setattr('app._parse_pools', {})
+    
+    with patch('app.create_parse_pool', side_effect=lambda workers: MagicMock()) as mock_create:
+        with shared_parse_pool(2) as first:
+            pass
+        with shared_parse_pool(2) as second:
+            pass
+        with pytest.raises(BrokenProcessPool):
+            with shared_parse_pool(2):
+                raise BrokenProcessPool('worker died')
+        with shared_parse_pool(2) as third:
+            pass
+    
+    assert first is second
+    assert third is not first
+    first.shutdown.assert_called_once_with(wait=False)
+    assert mock_create.call_count == 2
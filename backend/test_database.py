@@ -5,14 +5,38 @@ database.pyの単体テスト
 import os
 import pytest
 import sqlite3
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 from database import (
     get_connection,
     init_database,
     insert_report,
     insert_reports_bulk,
     get_all_reports,
+    get_reports_page,
+    iter_reports,
+    get_report_stats_by_period,
+    rebuild_rollups,
+    get_reports_version,
+    rollup_bucket,
     get_latest_date,
     count_reports,
+    get_sync_cursor,
+    save_sync_cursor,
+    clear_sync_cursor,
+    filter_new_message_ids,
+    to_timestamp,
+    get_latest_timestamp,
+    get_report_stats,
+    close_all_connections,
+    connection,
+    account_db_path,
+    list_accounts,
+    validate_account_id,
+    save_raw_messages,
+    iter_raw_messages,
+    decode_raw_message,
+    count_raw_messages,
     DB_PATH
 )
 
@@ -20,12 +44,14 @@ from database import (
 @pytest.fixture
 def test_db():
     """テスト用DB準備"""
+    close_all_connections()
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
     
     init_database()
     yield
     
+    close_all_connections()
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
 
@@ -251,3 +277,519 @@ def test_count_reports_success(test_db):
     count = count_reports()
     
     assert count == 2
+
+
+def test_get_sync_cursor_empty(test_db):
+    """境界値: 未同期の場合はNone"""
+    assert get_sync_cursor() is None
+
+
+def test_save_sync_cursor_upsert(test_db):
+    """正常系: 同期カーソルは1行のみ保持され上書きされる"""
+    save_sync_cursor('100', 1756530037)
+    save_sync_cursor('200', 1756616437)
+    
+    cursor = get_sync_cursor()
+    
+    assert cursor['history_id'] == '200'
+    assert cursor['watermark'] == 1756616437
+
+
+def test_clear_sync_cursor(test_db):
+    """正常系: 同期カーソル削除"""
+    save_sync_cursor('100', 1756530037)
+    clear_sync_cursor()
+    
+    assert get_sync_cursor() is None
+
+
+def test_filter_new_message_ids(test_db):
+    """正常系: 保存済みのmessage_idを除外し入力順を維持"""
+    insert_report({
+        'message_id': 'test2',
+        'subject': '件名2',
+        'date': 'Sun, 31 Aug 2025 05:00:37 +0000',
+        'xp': 200,
+        'minutes': 60,
+        'lessons': 15,
+        'streak': 6
+    })
+    
+    result = filter_new_message_ids(['test3', 'test2', 'test1'])
+    
+    assert result == ['test3', 'test1']
+
+
+def test_filter_new_message_ids_empty(test_db):
+    """境界値: 空リストの場合は空リスト"""
+    assert filter_new_message_ids([]) == []
+
+
+def test_to_timestamp():
+    """正常系: RFC 2822の日付をUNIX秒に変換"""
+    assert to_timestamp('Sun, 31 Aug 2025 05:00:37 +0000') == 1756616437
+    assert to_timestamp('Sun, 31 Aug 2025 14:00:37 +0900') == 1756616437
+
+
+def test_to_timestamp_invalid():
+    """異常系: 解析できない日付は0"""
+    assert to_timestamp('not a date') == 0
+
+
+def test_init_database_migrates_timestamp_column():
+    """正常系: timestamp列のない既存DBは列追加と埋め戻しを行う"""
+    close_all_connections()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("""
+        CREATE TABLE reports (
+            message_id TEXT PRIMARY KEY,
+            subject TEXT NOT NULL,
+            date TEXT NOT NULL,
+            xp INTEGER NOT NULL,
+            minutes INTEGER NOT NULL,
+            lessons INTEGER NOT NULL,
+            streak INTEGER NOT NULL
+        )
+    """)
+    conn.executemany("INSERT INTO reports VALUES (?, ?, ?, 0, 0, 0, 0)", [
+        ('old1', '古い', 'Sat, 30 Aug 2025 05:00:37 +0000'),
+        ('old2', '新しい', 'Sun, 31 Aug 2025 05:00:37 +0000')
+    ])
+    conn.commit()
+    conn.close()
+    
+    try:
+        init_database()
+        
+        assert [r['subject'] for r in get_all_reports()] == ['新しい', '古い']
+        assert get_latest_date() == 'Sun, 31 Aug 2025 05:00:37 +0000'
+    finally:
+        close_all_connections()
+        os.remove(DB_PATH)
+
+
+def test_get_all_reports_uses_timestamp_index(test_db):
+    """正常系: 日付順の取得はtimestampインデックスを使う"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT message_id FROM reports ORDER BY timestamp DESC
+    """)
+    plan = ' '.join(row['detail'] for row in cursor.fetchall())
+    conn.close()
+    
+    assert 'idx_reports_timestamp' in plan
+
+
+def test_get_latest_timestamp(test_db):
+    """正常系: 最新timestamp取得、DB空ならNone"""
+    assert get_latest_timestamp() is None
+    
+    insert_reports_bulk([
+        {
+            'message_id': 'test1',
+            'subject': '古い',
+            'date': 'Sat, 30 Aug 2025 05:00:37 +0000',
+            'xp': 100,
+            'minutes': 50,
+            'lessons': 10,
+            'streak': 5
+        },
+        {
+            'message_id': 'test2',
+            'subject': '新しい',
+            'date': 'Sun, 31 Aug 2025 05:00:37 +0000',
+            'xp': 200,
+            'minutes': 60,
+            'lessons': 15,
+            'streak': 6
+        }
+    ])
+    
+    assert get_latest_timestamp() == 1756616437
+
+
+def test_get_report_stats(test_db):
+    """正常系: 件数・日付範囲・合計値を1回で取得"""
+    insert_reports_bulk([
+        {
+            'message_id': 'test1',
+            'subject': '古い',
+            'date': 'Sat, 30 Aug 2025 05:00:37 +0000',
+            'xp': 100,
+            'minutes': 50,
+            'lessons': 10,
+            'streak': 5
+        },
+        {
+            'message_id': 'test2',
+            'subject': '新しい',
+            'date': 'Sun, 31 Aug 2025 05:00:37 +0000',
+            'xp': 200,
+            'minutes': 60,
+            'lessons': 15,
+            'streak': 6
+        }
+    ])
+    
+    stats = get_report_stats()
+    
+    assert stats['count'] == 2
+    assert stats['first_date'] == 'Sat, 30 Aug 2025 05:00:37 +0000'
+    assert stats['last_date'] == 'Sun, 31 Aug 2025 05:00:37 +0000'
+    assert stats['total_xp'] == 300
+    assert stats['total_minutes'] == 110
+    assert stats['total_lessons'] == 25
+    assert stats['max_streak'] == 6
+
+
+def test_get_report_stats_empty(test_db):
+    """境界値: DB空の場合は0とNone"""
+    stats = get_report_stats()
+    
+    assert stats['count'] == 0
+    assert stats['last_date'] is None
+    assert stats['total_xp'] == 0
+
+
+def test_connection_applies_pragmas(test_db):
+    """正常系: 接続時にWALなどのPRAGMAが適用される"""
+    with connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_connection_reuses_pooled_connection(test_db):
+    """正常系: 返却された接続は再利用される"""
+    with connection() as first:
+        pass
+    with connection() as second:
+        assert second is first
+
+
+def test_connection_passthrough(test_db):
+    """正常系: 接続を渡せば同じ接続で処理される"""
+    conn = get_connection()
+    try:
+        with connection(conn) as shared:
+            assert shared is conn
+        
+        assert count_reports(conn) == 0
+    finally:
+        conn.close()
+
+
+def test_connection_discards_pool_when_db_replaced(test_db):
+    """正常系: DBファイルが作り直されたら古い接続は使わない"""
+    with connection() as first:
+        pass
+    
+    os.remove(DB_PATH)
+    init_database()
+    
+    with connection() as second:
+        assert second is not first
+        assert count_reports(second) == 0
+
+
+def test_insert_reports_bulk_chunked(test_db):
+    """正常系: chunk_sizeをまたいでも新規件数を正しく数える"""
+    reports = [
+        {
+            'message_id': f'test{i % 7}',
+            'subject': f'件名{i}',
+            'date': 'Sat, 30 Aug 2025 05:00:37 +0000',
+            'xp': i,
+            'minutes': i,
+            'lessons': i,
+            'streak': i
+        }
+        for i in range(10)
+    ]
+    
+    inserted_count = insert_reports_bulk(reports, chunk_size=3)
+    
+    assert inserted_count == 7
+    assert count_reports() == 7
+
+
+def test_insert_reports_bulk_upsert_updates_metrics(test_db):
+    """正常系: upsertは指標が変わった既存レポートを更新し、新規件数のみ返す"""
+    report = {
+        'message_id': 'test1',
+        'subject': '件名1',
+        'date': 'Sat, 30 Aug 2025 05:00:37 +0000',
+        'xp': 100,
+        'minutes': 50,
+        'lessons': 10,
+        'streak': 5
+    }
+    insert_reports_bulk([report])
+    
+    reparsed = dict(report, xp=150)
+    new_report = dict(report, message_id='test2')
+    
+    assert insert_reports_bulk([reparsed, new_report]) == 1
+    assert {r['message_id']: r['xp'] for r in get_all_reports()} == {'test1': 100, 'test2': 100}
+    
+    assert insert_reports_bulk([reparsed], upsert=True) == 0
+    assert {r['message_id']: r['xp'] for r in get_all_reports()} == {'test1': 150, 'test2': 100}
+
+
+def test_insert_reports_bulk_keeps_committed_chunks_on_error(test_db):
+    """異常系: 失敗したチャンクのみロールバックされる"""
+    reports = [
+        {
+            'message_id': f'test{i}',
+            'subject': f'件名{i}',
+            'date': 'Sat, 30 Aug 2025 05:00:37 +0000',
+            'xp': i,
+            'minutes': i,
+            'lessons': i,
+            'streak': i
+        }
+        for i in range(4)
+    ]
+    reports[3]['xp'] = {'invalid': True}
+    
+    with pytest.raises(sqlite3.Error):
+        insert_reports_bulk(reports, chunk_size=2)
+    
+    assert count_reports() == 2
+
+
+def make_weekly_reports(count):
+    """テスト用: 1週間おきのレポート生成（古い順）"""
+    start = datetime(2025, 1, 5, 5, 0, 37, tzinfo=timezone.utc)
+    return [
+        {
+            'message_id': f'week{i:02d}',
+            'subject': f'ウィークリーレポート{i}',
+            'date': format_datetime(start + timedelta(weeks=i)),
+            'xp': i,
+            'minutes': i,
+            'lessons': i,
+            'streak': i
+        }
+        for i in range(count)
+    ]
+
+
+def test_get_reports_page_keyset(test_db):
+    """正常系: beforeカーソルで重複・欠落なく全件を辿れる"""
+    insert_reports_bulk(make_weekly_reports(10))
+    
+    seen = []
+    before = None
+    while True:
+        page = get_reports_page(limit=3, before=before)
+        if not page:
+            break
+        seen.extend(report['message_id'] for report in page)
+        before = (page[-1]['timestamp'], page[-1]['_row_id'])
+    
+    assert seen == [f'week{i:02d}' for i in range(9, -1, -1)]
+
+
+def test_get_reports_page_after_returns_nearest_newer(test_db):
+    """正常系: afterカーソルはカーソル直後の新しいレポートを降順で返す"""
+    insert_reports_bulk(make_weekly_reports(10))
+    oldest = get_reports_page()[-1]
+    
+    page = get_reports_page(limit=3, after=(oldest['timestamp'], oldest['_row_id']))
+    
+    assert [report['message_id'] for report in page] == ['week03', 'week02', 'week01']
+
+
+def test_get_reports_page_date_range(test_db):
+    """正常系: sinceは以上、untilは未満で絞り込む"""
+    reports = make_weekly_reports(10)
+    insert_reports_bulk(reports)
+    since = to_timestamp(reports[2]['date'])
+    until = to_timestamp(reports[5]['date'])
+    
+    page = get_reports_page(since=since, until=until)
+    
+    assert [report['message_id'] for report in page] == ['week04', 'week03', 'week02']
+
+
+def test_get_reports_page_uses_timestamp_index(test_db):
+    """正常系: キーセット検索は一時ソートなしでインデックスを使う"""
+    with get_connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT message_id FROM reports
+            WHERE (timestamp, rowid) < (?, ?) AND timestamp >= ?
+            ORDER BY timestamp DESC, rowid DESC
+            LIMIT 3
+        """, (0, 0, 0)))
+    
+    assert 'idx_reports_timestamp' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_get_report_stats_by_period_year(test_db):
+    """正常系: 年別集計（古い順）"""
+    reports = make_weekly_reports(3)
+    reports[2]['date'] = 'Mon, 05 Jan 2026 05:00:37 +0000'
+    insert_reports_bulk(reports)
+    
+    groups = get_report_stats_by_period('year')
+    
+    assert [(g['period'], g['count'], g['total_xp'], g['max_streak']) for g in groups] == [
+        ('2025', 2, 1, 1),
+        ('2026', 1, 2, 2)
+    ]
+
+
+def test_get_report_stats_by_period_invalid(test_db):
+    """異常系: 未対応の集計単位"""
+    with pytest.raises(ValueError):
+        get_report_stats_by_period('day')
+
+
+def test_rollup_bucket_week_starts_monday(test_db):
+    """正常系: 週バケットは月曜0時（UTC）始まり"""
+    sunday = to_timestamp('Sun, 31 Aug 2025 05:00:37 +0000')
+    
+    bucket, start, end = rollup_bucket('week', sunday)
+    
+    assert bucket == '2025-08-25'
+    assert end - start == 7 * 24 * 60 * 60
+    assert start <= sunday < end
+
+
+def test_rollups_updated_on_insert_match_rebuild(test_db):
+    """正常系: 挿入・upsert時の差分更新結果が全件再構築と一致"""
+    reports = make_weekly_reports(12)
+    insert_reports_bulk(reports[:7], chunk_size=3)
+    insert_report(reports[7])
+    insert_reports_bulk(reports[8:] + [dict(reports[0], xp=999)], upsert=True)
+    
+    incremental = {period: get_report_stats_by_period(period) for period in ('week', 'month', 'year')}
+    rebuild_rollups()
+    rebuilt = {period: get_report_stats_by_period(period) for period in ('week', 'month', 'year')}
+    
+    assert incremental == rebuilt
+    assert len(rebuilt['week']) == 12
+    assert rebuilt['year'][0]['total_xp'] == sum(range(1, 12)) + 999
+
+
+def test_init_database_builds_rollups_for_existing_db(test_db):
+    """正常系: 集計テーブル導入前のDBは初期化時に構築"""
+    insert_reports_bulk(make_weekly_reports(3))
+    with get_connection() as conn:
+        conn.execute("DROP TABLE report_rollups")
+    
+    init_database()
+    
+    assert [g['count'] for g in get_report_stats_by_period('year')] == [3]
+
+
+def test_get_report_stats_by_period_reads_rollups(test_db):
+    """正常系: 期間別集計はreportsを走査せず集計テーブルの主キーで引く"""
+    with get_connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT bucket FROM report_rollups WHERE period = ? ORDER BY bucket
+        """, ('month',)))
+    
+    assert 'report_rollups' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_reports_version_bumped_only_on_change(test_db):
+    """正常系: 版数は行の追加・更新時のみ増える"""
+    reports = make_weekly_reports(2)
+    initial = get_reports_version()['version']
+    
+    insert_reports_bulk(reports)
+    after_insert = get_reports_version()['version']
+    insert_reports_bulk(reports, upsert=True)
+    after_noop = get_reports_version()['version']
+    insert_reports_bulk([dict(reports[0], xp=999)], upsert=True)
+    
+    assert after_insert == initial + 1
+    assert after_noop == after_insert
+    assert get_reports_version()['version'] == after_insert + 1
+
+
+def test_iter_reports_batches(test_db):
+    """正常系: 日付昇順にbatch_size件ずつ返す"""
+    insert_reports_bulk(make_weekly_reports(5))
+    
+    batches = list(iter_reports(batch_size=2))
+    
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [row['message_id'] for batch in batches for row in batch] == [f'week{i:02d}' for i in range(5)]
+
+
+def test_accounts_use_separate_databases(test_db, tmp_path, monkeypatch):
+    """正常系: アカウントごとに別のDBファイルへ保存"""
+    monkeypatch.setattr('database.ACCOUNTS_DIR', str(tmp_path))
+    init_database('alice')
+    
+    with connection(account_id='alice') as conn:
+        insert_reports_bulk(make_weekly_reports(2), conn)
+        alice_count = count_reports(conn)
+    
+    assert account_db_path() == DB_PATH
+    assert account_db_path('alice') == str(tmp_path / 'alice' / 'duolingo_data.db')
+    assert list_accounts() == ['default', 'alice']
+    assert alice_count == 2
+    assert count_reports() == 0
+
+
+def test_validate_account_id_rejects_paths():
+    """異常系: パス区切りなどを含むアカウントIDは拒否"""
+    for account_id in ('../etc', 'a/b', '', 'x' * 65, None):
+        with pytest.raises(ValueError):
+            validate_account_id(account_id)
+
+
+def make_raw_message(message_id, text):
+    """テスト用生メッセージ"""
+    return {
+        'message_id': message_id,
+        'subject': 'ウィークリーレポート',
+        'date': 'Sun, 31 Aug 2025 05:00:37 +0000',
+        'message': {'id': message_id, 'payload': {'mimeType': 'text/plain', 'body': {'data': text}}}
+    }
+
+
+def test_save_raw_messages_round_trip(test_db):
+    """正常系: 圧縮して保存し、復元すると元のメッセージに戻る"""
+    raw = make_raw_message('msg1', 'A' * 10000)
+    
+    assert save_raw_messages([raw]) == 1
+    rows = [row for batch in iter_raw_messages() for row in batch]
+    
+    assert len(rows) == 1
+    assert len(rows[0]['payload']) < 1000
+    assert decode_raw_message(rows[0]['payload']) == raw['message']
+
+
+def test_save_raw_messages_skips_unchanged(test_db):
+    """正常系: 内容が同じなら書き換えず、変わっていれば更新"""
+    save_raw_messages([make_raw_message('msg1', 'a')])
+    
+    unchanged = save_raw_messages([make_raw_message('msg1', 'a')])
+    changed = save_raw_messages([make_raw_message('msg1', 'b')])
+    
+    assert unchanged == 0
+    assert changed == 1
+    assert count_raw_messages() == 1
+
+
+def test_filter_new_message_ids_require_raw(test_db):
+    """正常系: require_raw=Trueなら生メッセージ未保存のレポートも対象に残す"""
+    insert_reports_bulk(make_weekly_reports(2))
+    save_raw_messages([make_raw_message('week00', 'a')])
+    
+    assert filter_new_message_ids(['week00', 'week01', 'new']) == ['new']
+    assert filter_new_message_ids(['week00', 'week01', 'new'], require_raw=True) == ['week01', 'new']
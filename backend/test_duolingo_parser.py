@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+duolingo_parser.pyの単体テスト
+"""
+import re
+import base64
+import pytest
+import duolingo_parser
+from duolingo_parser import (
+    is_weekly_report,
+    extract_duolingo_data,
+    extract_email_body,
+    parse_report
+)
+
+
+SAMPLE_BODY = "今週の進捗はいかに 4022XP 獲得 346分 学習 レッスン 69回 55日連続記録"
+
+
+def legacy_extract(body):
+    """旧実装（パターンごとのre.search）"""
+    data = {}
+    for key, pattern in (
+        ('xp', r'(\d+)XP'),
+        ('minutes', r'(\d+)分'),
+        ('lessons', r'レッスン\s*(\d+)回'),
+        ('streak', r'(\d+)日連続')
+    ):
+        match = re.search(pattern, body)
+        if match:
+            data[key] = int(match.group(1))
+    return data if data else None
+
+
+def legacy_is_weekly(subject, body):
+    """旧実装の判定"""
+    weekly_subjects = ["週間レポート", "ウィークリーレポート", "Weekly Progress", "進捗をチェック", "成果が積み重なって"]
+    if any(ws in subject for ws in weekly_subjects):
+        return True
+    patterns = [r'\d+XP', r'\d+分', r'レッスン\s*\d+回', r'\d+日連続', r'Weekly Progress']
+    return sum(1 for pattern in patterns if re.search(pattern, body)) >= 3
+
+
+def test_extract_duolingo_data_all_metrics():
+    """正常系: 4指標を抽出"""
+    assert extract_duolingo_data(SAMPLE_BODY) == {
+        'xp': 4022,
+        'minutes': 346,
+        'lessons': 69,
+        'streak': 55
+    }
+
+
+def test_extract_duolingo_data_first_match_wins():
+    """正常系: 各指標は最初の一致を採用"""
+    body = "先週 100XP → 今週 200XP、10分 → 20分"
+    
+    assert extract_duolingo_data(body) == {'xp': 100, 'minutes': 10}
+
+
+def test_extract_duolingo_data_none():
+    """境界値: 指標がなければNone"""
+    assert extract_duolingo_data("セールのお知らせ") is None
+
+
+def test_is_weekly_report_by_subject():
+    """正常系: 件名で判定"""
+    assert is_weekly_report("今週の進捗をチェック！", "") is True
+
+
+def test_is_weekly_report_by_body_threshold():
+    """正常系: 本文は3種類以上の一致で判定"""
+    assert is_weekly_report("お知らせ", "100XP 20分 3日連続") is True
+    assert is_weekly_report("お知らせ", "100XP 20分") is False
+
+
+def test_parse_report_combines_classification_and_data():
+    """正常系: 判定と抽出を同時に返す"""
+    is_weekly, data = parse_report("お知らせ", SAMPLE_BODY)
+    
+    assert is_weekly is True
+    assert data['lessons'] == 69
+
+
+@pytest.mark.parametrize('body', [
+    SAMPLE_BODY,
+    "レッスン 10分 12XP 5回 3日連続",
+    "1日連続2分3XPレッスン4回Weekly Progress",
+    "１２３XP 全角数字 ４分",
+    "Weekly Progress 12XP",
+    "12XP 3分 Weekly Progress",
+    "",
+])
+def test_single_pass_matches_legacy_regexes(body):
+    """互換性: 旧実装と同じ判定・抽出結果"""
+    assert extract_duolingo_data(body) == legacy_extract(body)
+    assert is_weekly_report("お知らせ", body) == legacy_is_weekly("お知らせ", body)
+
+
+def encode(text):
+    """base64url（パディング付き）エンコード"""
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def make_message(*parts):
+    """テスト用multipartメッセージ"""
+    return {'payload': {'mimeType': 'multipart/alternative', 'parts': list(parts)}}
+
+
+def test_extract_email_body_html_strips_tags_and_styles():
+    """正常系: タグは空白、style/scriptは除外、空白はまとめる"""
+    html = (
+        '<html><head><style>.x { width: 10分 }</style><script>var a = "5XP";</script></head>'
+        '<body><p>今週は&nbsp;<b>4022XP</b>\n\n  獲得</p></body></html>'
+    )
+    msg = make_message({'mimeType': 'text/html', 'body': {'data': encode(html)}})
+    
+    assert extract_email_body(msg) == '今週は 4022XP 獲得'
+
+
+@pytest.mark.parametrize('html, expected', [
+    ('<3分', '<3分'),
+    ('<p>今週は</p><3分', '今週は <3分'),
+    ('<p>1 < 3分</p><b', '1 < 3分')
+])
+def test_extract_email_body_keeps_bare_less_than(html, expected):
+    """境界値: タグにならない<以降の本文は残し、閉じていないタグだけを除く"""
+    msg = make_message({'mimeType': 'text/html', 'body': {'data': encode(html)}})
+    
+    body = extract_email_body(msg)
+    
+    assert body == expected
+    assert extract_duolingo_data(body) == {'minutes': 3}
+
+
+def test_extract_email_body_nested_parts_in_order():
+    """正常系: 入れ子のパートを順番に連結"""
+    msg = make_message(
+        {'mimeType': 'multipart/related', 'parts': [
+            {'mimeType': 'text/plain', 'body': {'data': encode('100XP ')}},
+            {'mimeType': 'image/png', 'body': {'attachmentId': 'img'}}
+        ]},
+        {'mimeType': 'text/html', 'body': {'data': encode('<p>20分</p>')}}
+    )
+    
+    assert extract_email_body(msg) == '100XP  20分'
+
+
+def test_extract_email_body_stops_when_all_metrics_found():
+    """正常系: 全指標が揃えば以降のパートはデコードしない"""
+    msg = make_message(
+        {'mimeType': 'text/plain', 'body': {'data': encode(SAMPLE_BODY)}},
+        {'mimeType': 'text/html', 'body': {'data': '!!invalid base64!!'}}
+    )
+    
+    assert extract_email_body(msg) == SAMPLE_BODY
+
+
+def test_extract_email_body_streams_multibyte_across_chunks(monkeypatch):
+    """正常系: デコード単位をまたぐマルチバイト文字・タグ・scriptも正しく扱う"""
+    monkeypatch.setattr(duolingo_parser, 'BODY_DECODE_CHUNK', 8)
+    html = (
+        '<div>今週の進捗</div><script>var s = "<b>9XP</b>";</script><!-- 1分 -->'
+        '<p>レッスン <span>69</span>回</p><p>55日連続</p>'
+    )
+    msg = make_message({'mimeType': 'text/html', 'body': {'data': encode(html)}})
+    
+    body = extract_email_body(msg)
+    
+    assert body == '今週の進捗 レッスン 69 回 55日連続'
+    assert extract_duolingo_data(body) == {'streak': 55}
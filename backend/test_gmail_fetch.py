@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+gmail_fetch.pyの単体テスト
+"""
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmail_fetch import (
+    ConcurrentMessageFetcher,
+    QuotaLimiter,
+    backoff_delay,
+    summarize_latencies,
+    fetch_messages_batch,
+    iter_message_id_pages,
+    list_history_message_ids
+)
+
+
+def make_http_error(status):
+    """テスト用HttpError生成"""
+    return HttpError(httplib2.Response({'status': status}), b'error')
+
+
+class FakeRequest:
+    """messages().get() の戻り値"""
+    
+    def __init__(self, service, message_id, kwargs):
+        self.service = service
+        self.message_id = message_id
+        self.kwargs = kwargs
+    
+    def execute(self):
+        errors = self.service.errors.get(self.message_id, [])
+        if errors:
+            raise errors.pop(0)
+        return {'id': self.message_id, 'kwargs': self.kwargs}
+
+
+class FakeBatch:
+    """new_batch_http_request() の戻り値"""
+    
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+    
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+    
+    def execute(self):
+        self.service.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            errors = self.service.errors.get(request.message_id, [])
+            if errors:
+                self.callback(request_id, None, errors.pop(0))
+            else:
+                self.callback(request_id, {'id': request.message_id, 'kwargs': request.kwargs}, None)
+
+
+class FakeExecutable:
+    """execute()で固定値を返すリクエスト"""
+    
+    def __init__(self, result):
+        self.result = result
+    
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeService:
+    """Gmail APIサービスのフェイク"""
+    
+    def __init__(self, errors=None, history_pages=None, list_pages=None):
+        self.errors = errors or {}
+        self.history_pages = history_pages or []
+        self.list_pages = list_pages or []
+        self.batch_sizes = []
+        self.history_calls = []
+        self.list_calls = []
+    
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+    
+    def users(self):
+        return self
+    
+    def messages(self):
+        return self
+    
+    def history(self):
+        return self
+    
+    def get(self, userId, id, **kwargs):
+        return FakeRequest(self, id, kwargs)
+    
+    def list(self, userId, pageToken=None, **kwargs):
+        if 'startHistoryId' in kwargs:
+            self.history_calls.append(pageToken)
+            return FakeExecutable(self.history_pages[len(self.history_calls) - 1])
+        self.list_calls.append(pageToken)
+        return FakeExecutable(self.list_pages[len(self.list_calls) - 1])
+
+
+def test_fetch_messages_batch_chunks():
+    """正常系: chunk_size件ずつバッチ送信"""
+    service = FakeService()
+    ids = [f'msg{i}' for i in range(120)]
+    
+    result = fetch_messages_batch(service, ids, chunk_size=50)
+    
+    assert service.batch_sizes == [50, 50, 20]
+    assert list(result.keys()) == ids
+
+
+def test_fetch_messages_batch_passes_get_kwargs():
+    """正常系: get()の追加引数を引き渡す"""
+    service = FakeService()
+    
+    result = fetch_messages_batch(service, ['msg1'], format='metadata')
+    
+    assert result['msg1']['kwargs'] == {'format': 'metadata'}
+
+
+def test_fetch_messages_batch_retries_retryable_errors():
+    """異常系: 429/5xxは再試行される"""
+    service = FakeService(errors={'msg2': [make_http_error(429), make_http_error(503)]})
+    
+    result = fetch_messages_batch(service, ['msg1', 'msg2'], retry_delay=0)
+    
+    assert set(result.keys()) == {'msg1', 'msg2'}
+    assert service.batch_sizes == [2, 1, 1]
+
+
+def test_fetch_messages_batch_gives_up_after_max_retries():
+    """異常系: 再試行上限を超えたら諦める"""
+    service = FakeService(errors={'msg1': [make_http_error(500)] * 5})
+    
+    result = fetch_messages_batch(service, ['msg1'], max_retries=2, retry_delay=0)
+    
+    assert result == {}
+    assert service.batch_sizes == [1, 1, 1]
+
+
+def test_fetch_messages_batch_skips_non_retryable_errors():
+    """異常系: 404などは再試行しない"""
+    service = FakeService(errors={'msg1': [make_http_error(404)]})
+    
+    result = fetch_messages_batch(service, ['msg1', 'msg2'], retry_delay=0)
+    
+    assert set(result.keys()) == {'msg2'}
+    assert service.batch_sizes == [2]
+
+
+def test_fetch_messages_batch_invalid_chunk_size():
+    """異常系: chunk_sizeが範囲外"""
+    with pytest.raises(ValueError):
+        fetch_messages_batch(FakeService(), ['msg1'], chunk_size=101)
+
+
+def test_list_history_message_ids_follows_pages():
+    """正常系: 複数ページのhistoryから追加メッセージIDを重複なく取得"""
+    service = FakeService(history_pages=[
+        {
+            'history': [{'messagesAdded': [{'message': {'id': 'msg1'}}]}],
+            'historyId': '110',
+            'nextPageToken': 'page2'
+        },
+        {
+            'history': [
+                {'messagesAdded': [{'message': {'id': 'msg2'}}, {'message': {'id': 'msg1'}}]}
+            ],
+            'historyId': '120'
+        }
+    ])
+    
+    message_ids, history_id = list_history_message_ids(service, '100')
+    
+    assert message_ids == ['msg1', 'msg2']
+    assert history_id == '120'
+    assert service.history_calls == [None, 'page2']
+
+
+def test_list_history_message_ids_no_changes():
+    """境界値: 変更なしの場合は空リストと最新historyId"""
+    service = FakeService(history_pages=[{'historyId': '130'}])
+    
+    assert list_history_message_ids(service, '100') == ([], '130')
+
+
+def test_list_history_message_ids_expired_cursor():
+    """異常系: カーソル失効（404）の場合はNone"""
+    service = FakeService(history_pages=[make_http_error(404)])
+    
+    assert list_history_message_ids(service, '1') is None
+
+
+def test_iter_message_id_pages_follows_next_page_token():
+    """正常系: nextPageTokenを辿って全ページ取得"""
+    service = FakeService(list_pages=[
+        {'messages': [{'id': 'msg1'}, {'id': 'msg2'}], 'nextPageToken': 'page2'},
+        {'messages': [{'id': 'msg3'}]}
+    ])
+    
+    pages = list(iter_message_id_pages(service, 'from:duolingo', page_size=2))
+    
+    assert pages == [['msg1', 'msg2'], ['msg3']]
+    assert service.list_calls == [None, 'page2']
+
+
+def test_iter_message_id_pages_is_lazy():
+    """正常系: 次ページは消費されるまで取得しない"""
+    service = FakeService(list_pages=[
+        {'messages': [{'id': 'msg1'}], 'nextPageToken': 'page2'},
+        {'messages': [{'id': 'msg2'}]}
+    ])
+    
+    pages = iter_message_id_pages(service, 'from:duolingo')
+    first = next(pages)
+    
+    assert first == ['msg1']
+    assert service.list_calls == [None]
+
+
+def test_iter_message_id_pages_empty():
+    """境界値: 一致なしの場合はページを返さない"""
+    service = FakeService(list_pages=[{'resultSizeEstimate': 0}])
+    
+    assert list(iter_message_id_pages(service, 'from:duolingo')) == []
+
+
+def test_backoff_delay_is_bounded():
+    """正常系: バックオフは0〜min(max, base*2^attempt)の範囲"""
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base_delay=1.0, max_delay=8.0)
+        assert 0 <= delay <= min(8.0, 2 ** attempt)
+
+
+def test_quota_limiter_waits_when_exhausted():
+    """正常系: 枠を使い切ったら必要な秒数だけ待機"""
+    now = [0.0]
+    sleeps = []
+    
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    
+    limiter = QuotaLimiter(units_per_second=10, clock=lambda: now[0], sleep=fake_sleep)
+    limiter.acquire(10)
+    limiter.acquire(5)
+    
+    assert sleeps == [pytest.approx(0.5)]
+
+
+def test_summarize_latencies():
+    """正常系: レイテンシ集計（ミリ秒）"""
+    summary = summarize_latencies([0.1, 0.2, 0.3, 0.4])
+    
+    assert summary['count'] == 4
+    assert summary['p50_ms'] == 250.0
+    assert summary['max_ms'] == 400.0
+
+
+def test_summarize_latencies_empty():
+    """境界値: リクエストなし"""
+    assert summarize_latencies([])['count'] == 0
+
+
+def test_concurrent_fetcher_fetches_all():
+    """正常系: 並列取得し入力順で返す"""
+    services = []
+    
+    def factory():
+        service = FakeService()
+        services.append(service)
+        return service
+    
+    ids = [f'msg{i}' for i in range(20)]
+    with ConcurrentMessageFetcher(factory, max_workers=4, limiter=QuotaLimiter(1e9)) as fetcher:
+        result = fetcher.fetch(ids, format='full')
+        stats = fetcher.stats()
+    
+    assert list(result.keys()) == ids
+    assert result['msg0']['kwargs'] == {'format': 'full'}
+    assert 1 <= len(services) <= 4
+    assert stats['count'] == 20
+    assert stats['workers'] == 4
+
+
+def test_concurrent_fetcher_retries_rate_limit():
+    """異常系: 429/5xxはバックオフして再試行"""
+    service = FakeService(errors={'msg1': [make_http_error(429), make_http_error(500)]})
+    
+    with ConcurrentMessageFetcher(lambda: service, max_workers=1, base_delay=0, limiter=QuotaLimiter(1e9)) as fetcher:
+        result = fetcher.fetch(['msg1'])
+        stats = fetcher.stats()
+    
+    assert 'msg1' in result
+    assert stats['retries'] == 2
+    assert stats['count'] == 3
+
+
+def test_concurrent_fetcher_skips_non_retryable():
+    """異常系: 404は再試行せず失敗として数える"""
+    service = FakeService(errors={'msg1': [make_http_error(404)]})
+    
+    with ConcurrentMessageFetcher(lambda: service, max_workers=2, limiter=QuotaLimiter(1e9)) as fetcher:
+        result = fetcher.fetch(['msg1', 'msg2'])
+        stats = fetcher.stats()
+    
+    assert list(result.keys()) == ['msg2']
+    assert stats['failures'] == 1
+    assert stats['retries'] == 0
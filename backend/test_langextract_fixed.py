@@ -4,6 +4,7 @@ LangExtract テスト - Duolingoメール解析（修正版）
 """
 import langextract as lx
 from get_duolingo_weekly_reports_fixed import get_duolingo_weekly_reports
+from duolingo_parser import extract_duolingo_data
 
 def test_langextract_parsing():
     """LangExtractでDuolingoデータ解析テスト"""
@@ -67,30 +68,10 @@ def test_langextract_parsing():
 
 def manual_extract(body):
     """手動正規表現解析"""
-    import re
-    data = {}
+    data = extract_duolingo_data(body) or {}
+    labels = {'xp': 'XP', 'minutes': 'Minutes', 'lessons': 'Lessons', 'streak': 'Streak'}
     
-    # XP抽出
-    xp_match = re.search(r'(\d+)XP', body)
-    if xp_match:
-        data['XP'] = xp_match.group(1)
-    
-    # 分数抽出
-    minutes_match = re.search(r'(\d+)分', body)
-    if minutes_match:
-        data['Minutes'] = minutes_match.group(1)
-    
-    # レッスン数抽出
-    lessons_match = re.search(r'レッスン\s*(\d+)回', body)
-    if lessons_match:
-        data['Lessons'] = lessons_match.group(1)
-    
-    # 連続記録抽出
-    streak_match = re.search(r'(\d+)日連続', body)
-    if streak_match:
-        data['Streak'] = streak_match.group(1)
-    
-    return data
+    return {labels[key]: str(value) for key, value in data.items()}
 
 if __name__ == '__main__':
     test_langextract_parsing()
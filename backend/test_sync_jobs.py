@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+sync_jobs.pyの単体テスト
+"""
+import threading
+
+from sync_jobs import SyncJobRunner, SyncProgress
+
+
+def test_sync_progress_add():
+    """正常系: 件数を加算して写しを返す"""
+    progress = SyncProgress()
+    progress.add(listed=3, fetched=2)
+    progress.add(fetched=1, errors=1)
+    
+    assert progress.snapshot() == {'listed': 3, 'fetched': 3, 'parsed': 0, 'inserted': 0, 'errors': 1}
+
+
+def test_runner_runs_job_with_progress():
+    """正常系: ジョブを実行し結果と進捗を記録"""
+    def target(progress, full=False):
+        progress.add(inserted=2)
+        return 2 if not full else 5
+    
+    runner = SyncJobRunner(target)
+    job, created = runner.submit(full=True)
+    
+    assert created is True
+    assert runner.wait(5) is True
+    assert job.status == 'succeeded'
+    assert job.result == 5
+    assert job.to_dict()['progress']['inserted'] == 2
+    assert runner.get(job.id) is job
+
+
+def test_runner_deduplicates_active_job():
+    """正常系: 実行中に来た要求は同じジョブに合流"""
+    release = threading.Event()
+    calls = []
+    
+    def target(progress):
+        calls.append(1)
+        release.wait(5)
+        return 0
+    
+    runner = SyncJobRunner(target)
+    first, first_created = runner.submit()
+    second, second_created = runner.submit()
+    release.set()
+    runner.wait(5)
+    third, third_created = runner.submit()
+    runner.wait(5)
+    
+    assert second is first
+    assert (first_created, second_created, third_created) == (True, False, True)
+    assert third is not first
+    assert len(calls) == 2
+
+
+def test_runner_records_failure():
+    """異常系: 例外はジョブの失敗として記録"""
+    def target(progress):
+        raise RuntimeError('auth failed')
+    
+    runner = SyncJobRunner(target)
+    job, _ = runner.submit()
+    runner.wait(5)
+    
+    assert job.status == 'failed'
+    assert job.error == 'auth failed'
+
+
+def test_runner_keeps_bounded_history():
+    """境界値: 保持するジョブ数はhistory_sizeまで"""
+    runner = SyncJobRunner(lambda progress: 0, history_size=2)
+    jobs = []
+    for _ in range(3):
+        job, _ = runner.submit()
+        runner.wait(5)
+        jobs.append(job)
+    
+    assert runner.get(jobs[0].id) is None
+    assert runner.get(jobs[2].id) is jobs[2]
+
+
+def test_runner_history_keeps_active_jobs():
+    """境界値: 履歴の上限を超えても実行中・待機中のジョブは追い出さず、終了後に古い順で追い出す"""
+    release = threading.Event()
+    
+    def target(progress, account_id):
+        release.wait(5)
+        return account_id
+    
+    runner = SyncJobRunner(target, max_workers=3, history_size=2)
+    jobs = [runner.submit(key=account_id, account_id=account_id)[0] for account_id in ('a', 'b', 'c')]
+    
+    assert all(runner.get(job.id) is job for job in jobs)
+    
+    release.set()
+    runner.wait(5)
+    
+    assert runner.get(jobs[0].id) is None
+    assert runner.get(jobs[2].id) is jobs[2]
+
+
+def test_runner_runs_different_keys_in_parallel():
+    """正常系: キーが異なるジョブは合流せず並行して実行"""
+    release = threading.Event()
+    started = []
+    
+    def target(progress, account_id):
+        started.append(account_id)
+        release.wait(5)
+        return account_id
+    
+    runner = SyncJobRunner(target, max_workers=2)
+    first, _ = runner.submit(key='a', account_id='a')
+    second, created = runner.submit(key='b', account_id='b')
+    
+    for _ in range(100):
+        if len(started) == 2:
+            break
+        threading.Event().wait(0.01)
+    release.set()
+    runner.wait(5)
+    
+    assert created is True
+    assert second is not first
+    assert sorted(started) == ['a', 'b']
+    assert (first.result, second.result) == ('a', 'b')
+
+
+def test_runner_queues_job_with_different_params():
+    """正常系: 実行中と引数が異なる要求は合流せず、終了後に順に実行"""
+    release = threading.Event()
+    calls = []
+    
+    def target(progress, full=False):
+        calls.append(full)
+        release.wait(5)
+        return full
+    
+    runner = SyncJobRunner(target, max_workers=2)
+    incremental, _ = runner.submit(key='a')
+    full, full_created = runner.submit(key='a', full=True)
+    again, again_created = runner.submit(key='a', full=True)
+    queued_status = full.status
+    release.set()
+    runner.wait(5)
+    
+    assert (full_created, again_created) == (True, False)
+    assert again is full
+    assert queued_status == 'queued'
+    assert calls == [False, True]
+    assert (incremental.result, full.result) == (False, True)
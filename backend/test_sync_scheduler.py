@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+sync_scheduler.pyの単体テスト
+"""
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from sync_scheduler import SyncScheduler, next_slot, parse_weekdays
+
+
+def utc(*args):
+    """UTC日時のUNIX秒"""
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def test_parse_weekdays():
+    """正常系: 重複を除き昇順で返す"""
+    assert parse_weekdays('6, 0,5,0') == (0, 5, 6)
+
+
+def test_parse_weekdays_invalid():
+    """異常系: 範囲外・数値以外・空は拒否"""
+    for value in ('7', 'sun', ''):
+        with pytest.raises(ValueError):
+            parse_weekdays(value)
+
+
+def test_next_slot_same_day_and_next_week():
+    """正常系: 当日の時刻前なら当日、過ぎていれば翌週の同じ曜日"""
+    # 2025-09-01は月曜
+    assert next_slot(utc(2025, 9, 1, 5), (0,), 6) == utc(2025, 9, 1, 6)
+    assert next_slot(utc(2025, 9, 1, 6), (0,), 6) == utc(2025, 9, 8, 6)
+
+
+def test_next_slot_picks_nearest_weekday():
+    """正常系: 複数曜日のうち最も近い曜日"""
+    # 2025-09-04は木曜 → 土曜
+    assert next_slot(utc(2025, 9, 4, 12), (5, 6, 0), 6) == utc(2025, 9, 6, 6)
+
+
+def make_scheduler(accounts, submitted, jitter=0):
+    return SyncScheduler(
+        submitted.append,
+        lambda: accounts,
+        weekdays=(0,),
+        hour=6,
+        jitter=jitter,
+        rng=random.Random(0)
+    )
+
+
+def test_run_pending_submits_when_due():
+    """正常系: 初回は次回時刻を決めるだけで、時刻が来たら投入して翌週へ"""
+    submitted = []
+    scheduler = make_scheduler(['default'], submitted)
+    
+    scheduler.run_pending(utc(2025, 9, 1, 5))
+    scheduler.run_pending(utc(2025, 9, 1, 5, 59))
+    assert submitted == []
+    
+    assert scheduler.run_pending(utc(2025, 9, 1, 6)) == ['default']
+    assert scheduler.next_runs() == {'default': utc(2025, 9, 8, 6)}
+
+
+def test_run_pending_spreads_accounts_with_jitter():
+    """正常系: アカウントごとに0〜jitter秒ずらす"""
+    submitted = []
+    scheduler = make_scheduler(['alice', 'bob', 'default'], submitted, jitter=1800)
+    
+    scheduler.run_pending(utc(2025, 9, 1, 5))
+    due = scheduler.next_runs()
+    
+    assert len(set(due.values())) == 3
+    assert all(utc(2025, 9, 1, 6) <= value <= utc(2025, 9, 1, 6, 30) for value in due.values())
+
+
+def test_run_pending_tracks_account_changes():
+    """正常系: 削除されたアカウントは予定から外し、追加は次回時刻から"""
+    accounts = ['default', 'alice']
+    submitted = []
+    scheduler = make_scheduler(accounts, submitted)
+    scheduler.run_pending(utc(2025, 9, 1, 5))
+    
+    accounts.remove('alice')
+    accounts.append('bob')
+    scheduler.run_pending(utc(2025, 9, 1, 6))
+    
+    assert submitted == ['default']
+    assert set(scheduler.next_runs()) == {'default', 'bob'}
+
+
+def test_run_pending_survives_submit_error():
+    """異常系: 投入に失敗しても次回時刻を進めて他のアカウントを続行"""
+    submitted = []
+    
+    def submit(account_id):
+        if account_id == 'alice':
+            raise RuntimeError('boom')
+        submitted.append(account_id)
+    
+    scheduler = SyncScheduler(submit, lambda: ['alice', 'default'], weekdays=(0,), hour=6, jitter=0)
+    scheduler.run_pending(utc(2025, 9, 1, 5))
+    scheduler.run_pending(utc(2025, 9, 1, 6))
+    
+    assert submitted == ['default']
+    assert scheduler.next_runs()['alice'] == utc(2025, 9, 8, 6)
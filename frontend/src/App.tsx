@@ -11,6 +11,38 @@ interface DuolingoData {
   streak: number;
 }
 
+interface WeekMetrics {
+  xp: number;
+  minutes: number;
+  lessons: number;
+  streak: number;
+}
+
+interface Summary {
+  count: number;
+  total_xp: number;
+  total_minutes: number;
+  total_lessons: number;
+  max_streak: number;
+  current_streak: number;
+  avg_xp_per_week: number;
+  avg_minutes_per_week: number;
+  avg_lessons_per_week: number;
+  avg_minutes_per_lesson: number;
+}
+
+interface WeekOverWeek {
+  current: WeekMetrics;
+  previous: WeekMetrics;
+  delta: WeekMetrics;
+}
+
+interface SyncJob {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  error: string | null;
+}
+
 interface WeekComparison {
   current: number;
   previous: number;
@@ -21,6 +53,8 @@ interface WeekComparison {
 
 function App() {
   const [data, setData] = useState<DuolingoData[]>([]);
+  const [summary, setSummary] = useState<Summary | null>(null);
+  const [weekOverWeek, setWeekOverWeek] = useState<WeekOverWeek | null>(null);
   const [loading, setLoading] = useState(false);
   const [hoveredCard, setHoveredCard] = useState<number | null>(null);
 
@@ -31,14 +65,52 @@ function App() {
     streak: '#f59e0b'
   };
 
+  const fetchSummary = async () => {
+    const response = await fetch('http://localhost:5000/api/duolingo/summary');
+    const result = await response.json();
+    
+    if (result.success) {
+      setSummary(result.summary);
+      setWeekOverWeek(result.week_over_week);
+    }
+  };
+
+  const waitForSyncJob = async (jobId: string) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      const response = await fetch(`http://localhost:5000/api/duolingo/sync/${jobId}`);
+      const result = await response.json();
+      const job: SyncJob | undefined = result.job;
+      
+      if (!result.success || !job || job.status === 'succeeded' || job.status === 'failed') {
+        if (job?.error) {
+          console.error('同期エラー:', job.error);
+        }
+        return;
+      }
+    }
+  };
+
+  const loadReports = async () => {
+    const response = await fetch('http://localhost:5000/api/duolingo/reports');
+    const result = await response.json();
+    
+    if (result.success) {
+      setData(result.data);
+    }
+    await fetchSummary();
+    return result;
+  };
+
   const fetchData = async () => {
     setLoading(true);
     try {
-      const response = await fetch('http://localhost:5000/api/duolingo/reports');
-      const result = await response.json();
+      const result = await loadReports();
       
-      if (result.success) {
-        setData(result.data);
+      // 初回同期がバックグラウンドで走っていれば完了を待って再取得
+      if (result.success && result.syncing && result.sync_job) {
+        await waitForSyncJob(result.sync_job.id);
+        await loadReports();
       }
     } catch (error) {
       console.error('データ取得エラー:', error);
@@ -56,7 +128,8 @@ function App() {
       const result = await response.json();
       
       if (result.success) {
-        setData(result.data);
+        await waitForSyncJob(result.job.id);
+        await loadReports();
       }
     } catch (error) {
       console.error('同期エラー:', error);
@@ -70,7 +143,7 @@ function App() {
   }, []);
 
   const calculateStats = () => {
-    if (data.length === 0) return {
+    if (!summary || summary.count === 0) return {
       totalXP: 0,
       totalHours: 0,
       totalLessons: 0,
@@ -81,33 +154,23 @@ function App() {
       avgXPPerWeek: 0
     };
 
-    const totalXP = data.reduce((sum, item) => sum + item.xp, 0);
-    const totalMinutes = data.reduce((sum, item) => sum + item.minutes, 0);
-    const totalLessons = data.reduce((sum, item) => sum + item.lessons, 0);
-    const currentStreak = data[0]?.streak || 0;
-
-    const weekCount = data.length;
-    const avgMinutesPerWeek = weekCount > 0 ? totalMinutes / weekCount : 0;
-    const avgLessonsPerWeek = weekCount > 0 ? totalLessons / weekCount : 0;
-    const avgXPPerWeek = weekCount > 0 ? totalXP / weekCount : 0;
-
     return {
-      totalXP,
-      totalHours: Math.round(totalMinutes / 60 * 10) / 10,
-      totalLessons,
-      currentStreak,
-      avgMinutesPerDay: Math.round(avgMinutesPerWeek / 7),
-      avgMinutesPerLesson: totalLessons > 0 ? Math.round((totalMinutes / totalLessons) * 10) / 10 : 0,
-      avgLessonsPerDay: Math.round((avgLessonsPerWeek / 7) * 10) / 10,
-      avgXPPerWeek: Math.round(avgXPPerWeek)
+      totalXP: summary.total_xp,
+      totalHours: Math.round(summary.total_minutes / 60 * 10) / 10,
+      totalLessons: summary.total_lessons,
+      currentStreak: summary.current_streak,
+      avgMinutesPerDay: Math.round(summary.avg_minutes_per_week / 7),
+      avgMinutesPerLesson: summary.avg_minutes_per_lesson,
+      avgLessonsPerDay: Math.round((summary.avg_lessons_per_week / 7) * 10) / 10,
+      avgXPPerWeek: Math.round(summary.avg_xp_per_week)
     };
   };
 
   const calculateWeekComparisons = () => {
-    if (data.length < 2) return null;
+    if (!weekOverWeek) return null;
 
-    const thisWeek = data[0];
-    const lastWeek = data[1];
+    const thisWeek = weekOverWeek.current;
+    const lastWeek = weekOverWeek.previous;
 
     const createComparison = (current: number, previous: number): WeekComparison => {
       const diff = Math.round((current - previous) * 10) / 10;